@@ -0,0 +1,396 @@
+import hashlib
+import threading
+import typing
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from PIL import Image
+
+from .asset_store import FileIdentity, file_identity
+
+
+def image_bytes(image: Image.Image) -> int:
+    """
+    Memory used by a decoded image: 1 byte per pixel for palette and grayscale images,
+    4 for everything else (Pillow pads RGB out to 4 bytes too).
+    """
+    return image.width * image.height * (1 if image.mode in ("1", "L", "P") else 4)
+
+
+# mode, size and a hash of the pixels
+ContentKey = typing.Tuple[str, typing.Tuple[int, int], bytes]
+CropBox = typing.Tuple[int, int, int, int]
+# mode and size: only images with the same shape can have the same content
+_Shape = typing.Tuple[str, typing.Tuple[int, int]]
+
+
+def content_key(image: Image.Image) -> ContentKey:
+    digest = hashlib.blake2b(image.tobytes(), digest_size=20)
+    if image.mode == "P":
+        digest.update(bytes(image.getpalette("RGBA") or []))
+    return image.mode, image.size, digest.digest()
+
+
+class ImagePool:
+    """
+    Content-addressed images: every image interned with the same pixels is replaced by one
+    shared Image, and crops of interned images are shared per (source, crop box).
+    Hashing reads every pixel (and every page of a mapped image), so images are only
+    hashed once another live image has the same mode and size; until then nothing can
+    share with them. Images can also be interned under a cheap identity, such as the file
+    they were decoded from, which finds them again without hashing.
+    Only holds weak references, so images go away once nothing else uses them.
+    Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._images: "weakref.WeakValueDictionary[ContentKey, Image.Image]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._identities: "weakref.WeakValueDictionary[typing.Hashable, Image.Image]" = (
+            weakref.WeakValueDictionary()
+        )
+        # the image of each shape that hasn't been hashed, because it was the only one
+        self._unhashed: "weakref.WeakValueDictionary[_Shape, Image.Image]" = (
+            weakref.WeakValueDictionary()
+        )
+        # live hashed images per shape
+        self._hashed_shapes: typing.Dict[_Shape, int] = {}
+        self._hashed: typing.Set[int] = set()
+        self._crops: "weakref.WeakValueDictionary[typing.Tuple[int, CropBox], Image.Image]" = (
+            weakref.WeakValueDictionary()
+        )
+        # a token per live interned image, by id, for keying its crops
+        self._tokens: typing.Dict[int, int] = {}
+        self._next_token = 0
+        self._lock = threading.RLock()
+        # bytes that would have been held by duplicates, counted each time one is shared
+        self.saved_bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens)
+
+    def intern(
+        self, image: Image.Image, identity: typing.Optional[typing.Hashable] = None
+    ) -> Image.Image:
+        """
+        :param identity: Something that only images with these pixels are interned under,
+                         such as a file path and version.
+        :return: The pooled image with the same pixels, or image itself if it's the first.
+        """
+        shape = (image.mode, image.size)
+        with self._lock:
+            if identity is not None:
+                existing = self._identities.get(identity)
+                if existing is not None and (existing.mode, existing.size) == shape:
+                    return self._share(image, existing)
+            if id(image) in self._tokens:
+                return image
+            other = self._unhashed.get(shape)
+            if other is None and not self._hashed_shapes.get(shape):
+                # nothing to share with yet
+                self._unhashed[shape] = image
+                self._add(image, shape)
+                return self._remember(identity, image)
+            if other is not None:
+                # hashed below, now that it has company
+                del self._unhashed[shape]
+                self._mark_hashed(other, shape)
+        other_key = None if other is None else content_key(other)
+        key = content_key(image)
+        with self._lock:
+            if other is not None and other_key is not None:
+                self._images.setdefault(other_key, other)
+            existing = self._images.get(key)
+            if existing is not None:
+                return self._remember(identity, self._share(image, existing))
+            self._images[key] = image
+            self._add(image, shape)
+            self._mark_hashed(image, shape)
+            return self._remember(identity, image)
+
+    def _share(self, image: Image.Image, existing: Image.Image) -> Image.Image:
+        if existing is not image:
+            self.saved_bytes += image_bytes(image)
+        return existing
+
+    def _remember(
+        self, identity: typing.Optional[typing.Hashable], image: Image.Image
+    ) -> Image.Image:
+        if identity is not None:
+            self._identities[identity] = image
+        return image
+
+    def _add(self, image: Image.Image, shape: _Shape):
+        if id(image) in self._tokens:
+            return
+        self._tokens[id(image)] = self._next_token
+        self._next_token += 1
+        weakref.finalize(image, self._forget, id(image), shape)
+
+    def _mark_hashed(self, image: Image.Image, shape: _Shape):
+        if id(image) not in self._hashed:
+            self._hashed.add(id(image))
+            self._hashed_shapes[shape] = self._hashed_shapes.get(shape, 0) + 1
+
+    def _forget(self, image_id: int, shape: _Shape):
+        with self._lock:
+            self._tokens.pop(image_id, None)
+            if image_id in self._hashed:
+                self._hashed.remove(image_id)
+                self._hashed_shapes[shape] -= 1
+                if not self._hashed_shapes[shape]:
+                    del self._hashed_shapes[shape]
+
+    def crop(self, source: Image.Image, box: CropBox) -> Image.Image:
+        """
+        Crop an image, sharing the result with every other crop of the same box out of
+        the same image. Sources that weren't interned are just cropped.
+        """
+        with self._lock:
+            token = self._tokens.get(id(source))
+            if token is not None:
+                existing = self._crops.get((token, box))
+                if existing is not None:
+                    self.saved_bytes += image_bytes(existing)
+                    return existing
+        cropped = source.crop(box)
+        if token is None:
+            return cropped
+        cropped = self.intern(cropped)
+        with self._lock:
+            self._crops[(token, box)] = cropped
+        return cropped
+
+
+class AssetCache:
+    """
+    Decoded asset images, keyed by normalized path, with an optional byte budget.
+    When the budget is exceeded, the least recently used images are evicted first.
+    Pinned images (ones that live themes are using) are never evicted.
+    Images loaded through get_or_load remember which version of their file they came from,
+    so they can be dropped when the file changes.
+    Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        max_bytes: typing.Optional[int] = None,
+        check_files: bool = False,
+        verify_hash: bool = False,
+    ):
+        """
+        :param max_bytes: Byte budget, or None for no limit.
+        :param check_files: Stat the file on every get() and treat a changed file as a miss.
+        :param verify_hash: Hash files when they're loaded, and when their mtime changes
+                            compare hashes before deciding they changed.
+        """
+        self.max_bytes = max_bytes
+        self.check_files = check_files
+        self.verify_hash = verify_hash
+        self.current_bytes = 0
+        self._images: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._identities: typing.Dict[str, FileIdentity] = {}
+        # paths per image, by id, so an image shared by several paths is only counted once
+        self._refs: typing.Dict[int, int] = {}
+        self._pins: typing.Dict[str, int] = {}
+        # paths being decoded right now, so other threads wait instead of decoding again
+        self._loading: typing.Dict[str, "Future[Image.Image]"] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, path: str) -> bool:
+        with self._lock:
+            return path in self._images
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._images)
+
+    def get(self, path: str) -> typing.Optional[Image.Image]:
+        """
+        Get a cached image, marking it as recently used.
+        :return: The image, or None if it isn't cached.
+        """
+        with self._lock:
+            if self.check_files:
+                self.revalidate(path)
+            image = self._images.get(path)
+            if image is not None:
+                self._images.move_to_end(path)
+            return image
+
+    def put(
+        self,
+        path: str,
+        image: Image.Image,
+        identity: typing.Optional[FileIdentity] = None,
+    ) -> Image.Image:
+        """
+        Cache an image, replacing any previous image for the path, then evict down to budget.
+        :param identity: The version of the file the image was read from, if known.
+        :return: The image.
+        """
+        with self._lock:
+            self.discard(path)
+            self._images[path] = image
+            if identity is not None:
+                self._identities[path] = identity
+            refs = self._refs.get(id(image), 0)
+            if refs == 0:
+                self.current_bytes += image_bytes(image)
+            self._refs[id(image)] = refs + 1
+            self._evict()
+            return image
+
+    def setdefault(
+        self,
+        path: str,
+        image: Image.Image,
+        identity: typing.Optional[FileIdentity] = None,
+    ) -> Image.Image:
+        """
+        Cache an image unless the path already has one.
+        :return: Whichever image is cached for the path afterwards.
+        """
+        with self._lock:
+            existing = self.get(path)
+            if existing is not None:
+                return existing
+            return self.put(path, image, identity)
+
+    def identity(self, path: str) -> typing.Optional[FileIdentity]:
+        """
+        The version of the file the cached image was read from, or None if it's unknown.
+        """
+        with self._lock:
+            return self._identities.get(path)
+
+    def revalidate(self, path: str) -> bool:
+        """
+        Drop the cached image for a path if its file changed since it was read.
+        Costs one stat, plus a hash if verify_hash is set and the mtime changed.
+        :return: True if the image was dropped.
+        """
+        with self._lock:
+            identity = self._identities.get(path)
+            if identity is None:
+                return False
+            try:
+                current = file_identity(path)
+            except OSError:
+                current = None
+            if current is not None and current[:2] == identity[:2]:
+                return False
+            if current is not None and self.verify_hash and current[1] == identity[1]:
+                current = file_identity(path, True)
+                if current[2] == identity[2]:
+                    # only touched; remember the new mtime so it isn't hashed again
+                    self._identities[path] = current
+                    return False
+            self.discard(path)
+            return True
+
+    def discard(self, path: str):
+        with self._lock:
+            self._identities.pop(path, None)
+            image = self._images.pop(path, None)
+            if image is not None:
+                refs = self._refs.pop(id(image)) - 1
+                if refs == 0:
+                    self.current_bytes -= image_bytes(image)
+                else:
+                    self._refs[id(image)] = refs
+
+    def pin(self, path: str):
+        """
+        Protect a path from eviction. Pins are counted, so each pin needs its own unpin.
+        """
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path: str):
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+            self._evict()
+
+    def get_or_load(
+        self, path: str, load: typing.Callable[[], Image.Image]
+    ) -> Image.Image:
+        """
+        Get a cached image, or call load() to make it and cache the result.
+        If another thread is already loading the same path, wait for it instead.
+        """
+        with self._lock:
+            image = self.get(path)
+            if image is not None:
+                return image
+            pending = self._loading.get(path)
+            owner = pending is None
+            if pending is None:
+                pending = self._loading[path] = Future()
+        if not owner:
+            return pending.result()
+        try:
+            # before loading, so an edit made while decoding is caught next time
+            identity: typing.Optional[FileIdentity] = file_identity(
+                path, self.verify_hash
+            )
+        except OSError:
+            identity = None
+        try:
+            image = load()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[path]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[path]
+            self.put(path, image, identity)
+        pending.set_result(image)
+        return image
+
+    def pin_all(self, paths: typing.Iterable[str]):
+        for path in paths:
+            self.pin(path)
+
+    def unpin_all(self, paths: typing.Iterable[str]):
+        for path in paths:
+            self.unpin(path)
+
+    def is_pinned(self, path: str) -> bool:
+        with self._lock:
+            return path in self._pins
+
+    def resize(self, max_bytes: typing.Optional[int]):
+        """
+        Change the byte budget, evicting right away if it shrank.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """
+        Drop every cached image. Pins are kept, since the themes holding them are still alive.
+        """
+        with self._lock:
+            self._images.clear()
+            self._identities.clear()
+            self._refs.clear()
+            self.current_bytes = 0
+
+    def _evict(self):
+        if self.max_bytes is None or self.current_bytes <= self.max_bytes:
+            return
+        for path in list(self._images):
+            if self.current_bytes <= self.max_bytes:
+                break
+            if path not in self._pins:
+                self.discard(path)
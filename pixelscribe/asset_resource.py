@@ -1,11 +1,18 @@
+import contextvars
+import functools
 import os
 import os.path
 import re
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 from PIL import Image
 
+from . import load_stats
+from .asset_cache import AssetCache, ImagePool
+from .asset_store import AssetStore, FileIdentity, file_identity
 from .exceptions import ValidationError
 from .parser.json_types import JSON, JSONObject
 
@@ -19,6 +26,18 @@ def _normalize(path: str) -> str:
     return os.path.abspath(os.path.expanduser(path))
 
 
+def resolve_source(source: str, theme_directory: typing.Optional[str] = None) -> str:
+    """
+    Resolve a "source" from a theme file to the normalized path assets are cached under.
+    :param source: The path as written in the theme, relative to the theme unless absolute.
+    :param theme_directory: Path of the theme file or None for the cwd
+    :return: The normalized path.
+    """
+    if not os.path.isabs(source):
+        source = os.path.join(theme_directory or os.getcwd(), source)
+    return _normalize(source)
+
+
 def next_multiple(value: int, multiple: int) -> int:
     """
     Get the next multiple of a number.
@@ -38,6 +57,49 @@ def odd(value: int) -> int:
     return value + 1 if value % 2 == 0 else value
 
 
+def fill_tiles(
+    canvas: Image.Image,
+    tile: Image.Image,
+    width: int,
+    height: int,
+    phase: typing.Tuple[int, int] = (0, 0),
+):
+    """
+    Fill the top left width x height of a canvas with a tile, repeated in a grid.
+    One tile's worth is drawn, then the filled area is copied onto itself, doubling it
+    each time, so this takes about log2(columns) + log2(rows) pastes.
+    :param canvas: The image to paste onto. Anything outside width x height is left alone.
+    :param tile: The image to repeat.
+    :param width: Width of the area to fill.
+    :param height: Height of the area to fill.
+    :param phase: Where in the tile the top left corner of the canvas falls.
+    """
+    if width <= 0 or height <= 0:
+        return
+    phase_x, phase_y = phase[0] % tile.width, phase[1] % tile.height
+    if (phase_x, phase_y) == (0, 0) and tile.width <= width and tile.height <= height:
+        first = tile
+    else:
+        # one tile's worth, made of the up to four tiles that overlap it
+        first = Image.new(
+            canvas.mode, (min(tile.width, width), min(tile.height, height))
+        )
+        for x in (-phase_x, tile.width - phase_x):
+            for y in (-phase_y, tile.height - phase_y):
+                first.paste(tile, (x, y))
+    canvas.paste(first, (0, 0))
+    filled = first.width
+    while filled < width:
+        step = min(filled, width - filled)
+        canvas.paste(canvas.crop((0, 0, step, first.height)), (filled, 0))
+        filled += step
+    filled = first.height
+    while filled < height:
+        step = min(filled, height - filled)
+        canvas.paste(canvas.crop((0, 0, width, step)), (0, filled))
+        filled += step
+
+
 def check_feature(json_body: JSONObject, allowed: typing.List[str]) -> str:
     if "feature" not in json_body:
         raise ValidationError(
@@ -119,7 +181,100 @@ def get_justify(
     return justify
 
 
-shared_asset_cache: typing.Dict[str, Image.Image] = {}
+# decoded images shared by every AssetResource, keyed by normalized path
+shared_asset_cache = AssetCache()
+
+# one Image per distinct content, for sources and crops alike
+shared_image_pool = ImagePool()
+
+# where images missing from shared_asset_cache are loaded from
+_asset_store = AssetStore()
+
+
+def get_asset_store() -> AssetStore:
+    return _asset_store
+
+
+def set_asset_store(store: AssetStore) -> AssetStore:
+    """
+    Load assets from a different store from now on.
+    Images already in shared_asset_cache are dropped so they get loaded from the new store.
+    :return: The previous store.
+    """
+    global _asset_store
+    previous, _asset_store = _asset_store, store
+    shared_asset_cache.clear()
+    return previous
+
+
+def _check_crop(crop: typing.Optional[typing.Tuple[int, int, int, int]]):
+    # the errors Image.crop raises, so a bad box fails on import rather than when drawing
+    if crop is None:
+        return
+    if crop[2] < crop[0]:
+        raise ValueError("Coordinate 'right' is less than 'left'")
+    if crop[3] < crop[1]:
+        raise ValueError("Coordinate 'lower' is less than 'upper'")
+
+
+def _decode(path: str) -> Image.Image:
+    try:
+        # taken before loading, so a file that changes meanwhile isn't pooled as the new one
+        identity: typing.Optional[typing.Hashable] = (path, file_identity(path))
+    except OSError:
+        identity = None
+    start = time.perf_counter()
+    image = _asset_store.load(path)
+    load_stats.record_decode(path, image, time.perf_counter() - start)
+    return shared_image_pool.intern(image, identity)
+
+
+def asset_stats() -> load_stats.AssetStats:
+    """
+    Process-wide asset loading counters, with resident_bytes set to what
+    shared_asset_cache holds right now.
+    """
+    return load_stats.process_stats.snapshot(shared_asset_cache.current_bytes)
+
+
+def reset_asset_stats():
+    load_stats.process_stats.reset()
+
+
+def prefetch(
+    paths: typing.Iterable[str], max_workers: typing.Optional[int] = None
+) -> int:
+    """
+    Decode images into the shared asset cache on a thread pool, so assets made from them
+    later don't decode anything. Pillow releases the GIL while decoding, so this scales
+    with the number of workers.
+    Files that can't be read are skipped; importing them reports the error properly.
+    :param paths: Normalized paths, like the ones resolve_source returns.
+    :param max_workers: Number of threads, or None for the ThreadPoolExecutor default.
+    :return: How many images were decoded.
+    """
+    missing = [path for path in dict.fromkeys(paths) if path not in shared_asset_cache]
+    if not missing:
+        return 0
+    decoded = 0
+    with ThreadPoolExecutor(max_workers) as pool:
+        # copy the context so decodes count towards the theme being imported
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                shared_asset_cache.get_or_load,
+                path,
+                functools.partial(_decode, path),
+            )
+            for path in missing
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except (OSError, ValueError, Image.DecompressionBombError):
+                continue
+            decoded += 1
+    return decoded
 
 
 class AssetResource:
@@ -135,16 +290,83 @@ class AssetResource:
     ):
         self.source_path = _normalize(source)
         self._static = False
-        self.source: Image.Image = source_image or self._load()
-        if crop is None:
-            self.crop: typing.Tuple[int, int, int, int] = (
-                0,
-                0,
-                self.source.width,
-                self.source.height,
-            )
+        # memoized self.source.crop(self.crop); reset whenever either one changes
+        self._cropped: typing.Optional[Image.Image] = None
+        # decoded on first use; until then only the header has been read
+        self._source: typing.Optional[Image.Image] = source_image
+        # the version of the file the size (and later the pixels) came from
+        self._identity: typing.Optional[FileIdentity] = None
+        # without an explicit crop, the crop follows the source's size when it changes
+        self._auto_crop = crop is None
+        if crop is not None:
+            self._crop: typing.Tuple[int, int, int, int] = crop
+        if source_image is None:
+            source_size = self._read_size()
         else:
-            self.crop: typing.Tuple[int, int, int, int] = crop
+            _check_crop(crop)
+            source_size = source_image.size
+        if crop is None:
+            self._crop = (0, 0, source_size[0], source_size[1])
+
+    def _read_size(self) -> typing.Tuple[int, int]:
+        """
+        Get the size of the source image without decoding it, and check an explicit crop
+        the way cropping the decoded image would.
+        """
+        if not self._auto_crop:
+            _check_crop(self._crop)
+        cached = shared_asset_cache.get(self.source_path)
+        if cached is not None:
+            self._identity = shared_asset_cache.identity(self.source_path)
+            return cached.size
+        self._identity = file_identity(self.source_path)
+        # Image.open only reads the header; pixels aren't decoded until load()
+        with Image.open(self.source_path) as header:
+            return header.size
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        # the crop is cheap to redo, so don't pickle a second copy of the pixels
+        state = self.__dict__.copy()
+        state["_cropped"] = None
+        return state
+
+    @property
+    def source(self) -> Image.Image:
+        if self._source is None:
+            self._source = self._load()
+        return self._source
+
+    @source.setter
+    def source(self, image: Image.Image):
+        self._source = image
+        self._cropped = None
+
+    @property
+    def crop(self) -> typing.Tuple[int, int, int, int]:
+        return self._crop
+
+    @crop.setter
+    def crop(self, crop: typing.Tuple[int, int, int, int]):
+        _check_crop(crop)
+        shared_asset_cache.discard(self._expanded_key())
+        self._crop = crop
+        self._auto_crop = False
+        self._cropped = None
+
+    @property
+    def size(self) -> typing.Tuple[int, int]:
+        """
+        Size of the cropped image, worked out from the crop box without cropping anything.
+        """
+        return self._crop[2] - self._crop[0], self._crop[3] - self._crop[1]
+
+    @property
+    def width(self) -> int:
+        return self._crop[2] - self._crop[0]
+
+    @property
+    def height(self) -> int:
+        return self._crop[3] - self._crop[1]
 
     def _load(self) -> Image.Image:
         """
@@ -153,20 +375,127 @@ class AssetResource:
         """
         if self._static:
             return self.source
-        if self.source_path in shared_asset_cache:
-            return shared_asset_cache[self.source_path]
+        source = shared_asset_cache.get(self.source_path)
+        if source is not None:
+            load_stats.record_hit()
         else:
-            source: Image.Image = Image.open(self.source_path).convert("RGBA")
-            source.load()
-            shared_asset_cache[self.source_path] = source
-            return source
+            source = shared_asset_cache.get_or_load(
+                self.source_path, functools.partial(_decode, self.source_path)
+            )
+        self._identity = shared_asset_cache.identity(self.source_path) or self._identity
+        return source
+
+    @property
+    def identity(self) -> typing.Optional[FileIdentity]:
+        """
+        The version of the source file this asset was read from, or None if it's static.
+        """
+        return self._identity
+
+    def refresh(self) -> bool:
+        """
+        Reload the source if its file changed since it was read. Costs a stat otherwise.
+        Without an explicit crop, the crop is updated to the new size of the source.
+        A file that was deleted or can't be read counts as changed; get() reports why.
+        :return: True if the file changed.
+        """
+        if self._static:
+            return False
+        shared_asset_cache.revalidate(self.source_path)
+        current = shared_asset_cache.identity(self.source_path)
+        try:
+            if current is None:
+                current = file_identity(self.source_path)
+        except OSError:
+            # already dropped if it was missing last time too
+            missing = self._identity is None and self._source is None
+            self._drop_source()
+            return not missing
+        if self._identity is not None:
+            if current[:2] == self._identity[:2]:
+                return False
+            if any(current[2]) and current[2] == self._identity[2]:
+                self._identity = current  # only touched
+                return False
+        self._drop_source()
+        try:
+            width, height = self._read_size()
+        except OSError:
+            self._identity = None
+            return True
+        if self._auto_crop:
+            self._crop = (0, 0, width, height)
+        return True
+
+    def _drop_source(self):
+        shared_asset_cache.discard(self._expanded_key())
+        self._source = None
+        self._cropped = None
+        self._identity = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        True once the source image has been decoded.
+        """
+        return self._source is not None
+
+    @property
+    def is_static(self) -> bool:
+        """
+        True if this asset was made from an in-memory image rather than a file.
+        """
+        return self._static
 
     def get(self) -> Image.Image:
         """
         Get the source image, cropped.
+        The crop is made once and shared between calls, so don't modify it.
         :return:
         """
-        return self.source.crop(self.crop)
+        if self._cropped is not None:
+            return self._cropped
+        source = self.source
+        if source.mode == "P":
+            # the expanded crop lives in the shared cache, so its bytes count towards the
+            # budget and it can be evicted; it's expanded again if it was
+            return shared_asset_cache.get_or_load(
+                self._expanded_key(), functools.partial(self._expand, source)
+            )
+        self._cropped = shared_image_pool.crop(source, self._crop)
+        return self._cropped
+
+    @property
+    def expanded(self) -> typing.Optional[Image.Image]:
+        """
+        The RGBA crop of a palette mode source, if the shared cache holds one right now.
+        """
+        if self._source is None or self._source.mode != "P":
+            return None
+        return shared_asset_cache.get(self._expanded_key())
+
+    def _expanded_key(self) -> str:
+        # not a file, so the cache never finds an identity to revalidate it against
+        return "{}#rgba{}@{}".format(self.source_path, self._crop, self._identity)
+
+    def _expand(self, source: Image.Image) -> Image.Image:
+        left, upper, right, lower = self._crop
+        inside = (
+            max(left, 0),
+            max(upper, 0),
+            min(right, source.width),
+            min(lower, source.height),
+        )
+        if inside == self._crop:
+            return shared_image_pool.intern(source.crop(inside).convert("RGBA"))
+        # past the source, the crop is transparent like an RGBA crop, not palette entry 0
+        expanded = Image.new("RGBA", self.size)
+        if inside[0] < inside[2] and inside[1] < inside[3]:
+            expanded.paste(
+                source.crop(inside).convert("RGBA"),
+                (inside[0] - left, inside[1] - upper),
+            )
+        return shared_image_pool.intern(expanded)
 
     @classmethod
     def import_(
@@ -238,12 +567,8 @@ class AssetResource:
             )
         else:
             new_crop = None
-        # try to resolve the source path on the theme path if it's not absolute
-        if not os.path.isabs(source):
-            source = os.path.join(theme_directory, source)
-        # ensure it's absolute and all that
-        source = _normalize(source)
-        return cls(source, new_crop)
+        # resolve the source path on the theme path if it's not absolute
+        return cls(resolve_source(source, theme_directory), new_crop)
 
     @classmethod
     def from_image(cls, image: Image.Image):
@@ -275,16 +600,22 @@ class Feature:
 
     @property
     def width(self):
-        return self.source.width
+        return self._asset.width
 
     @property
     def height(self):
-        return self.source.height
+        return self._asset.height
 
     @property
     def source(self):
         return self._asset.get()
 
+    def assets(self) -> typing.List[AssetResource]:
+        """
+        Every asset this feature draws from, including overrides.
+        """
+        return [self._asset]
+
     @classmethod
     def import_(cls, json_body: JSON, theme_directory: typing.Optional[str] = None):
         if not isinstance(json_body, dict):
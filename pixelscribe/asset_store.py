@@ -0,0 +1,426 @@
+"""
+Where decoded asset images come from.
+
+An AssetStore turns an asset's path into an RGBA image. The default store decodes the file
+every time it's asked; the others keep decoded pixels somewhere that outlives the process.
+
+Stored entries are a header followed by width * height * 4 bytes of RGBA. The header
+records the source file's size and modification time (and optionally a hash of its
+contents), so entries that don't match the source anymore can be told apart.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import typing
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+from PIL import Image, ImageChops
+
+# source mtime (ns), source size, source sha256 (zeros if not hashed)
+FileIdentity = typing.Tuple[int, int, bytes]
+
+# magic, format, mode, width, height, then the FileIdentity
+HEADER = struct.Struct("<4sH4sIIqQ32s")
+_MAGIC = b"PXSA"
+_FORMAT = 1
+
+
+def decode(path: str) -> Image.Image:
+    """
+    Decode an image file to RGBA.
+    """
+    source: Image.Image = Image.open(path).convert("RGBA")
+    source.load()
+    return source
+
+
+def _hash_file(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def file_identity(path: str, verify_hash: bool = False) -> FileIdentity:
+    stat = os.stat(path)
+    digest = _hash_file(path) if verify_hash else bytes(32)
+    return stat.st_mtime_ns, stat.st_size, digest
+
+
+def _pack_header(image: Image.Image, identity: FileIdentity) -> bytes:
+    return HEADER.pack(_MAGIC, _FORMAT, b"RGBA", image.width, image.height, *identity)
+
+
+def _unpack_header(
+    header: bytes, identity: FileIdentity
+) -> typing.Optional[typing.Tuple[int, int]]:
+    """
+    :return: The image size, or None if the header is invalid or for a different file.
+    """
+    if len(header) < HEADER.size:
+        return None
+    magic, format_, mode, width, height, *source = HEADER.unpack(header[: HEADER.size])
+    if magic != _MAGIC or format_ != _FORMAT or mode != b"RGBA":
+        return None
+    if tuple(source) != identity:
+        return None
+    return width, height
+
+
+def _view(buffer: typing.Any, size: typing.Tuple[int, int]) -> Image.Image:
+    """
+    Read-only image over the pixels after a header, without copying them.
+    The image keeps the buffer alive.
+    """
+    if size[0] == 0 or size[1] == 0:
+        return Image.new("RGBA", size)
+    pixels = memoryview(buffer)[HEADER.size : HEADER.size + size[0] * size[1] * 4]
+    return Image.frombuffer("RGBA", size, pixels, "raw", "RGBA", 0, 1)
+
+
+class AssetStore:
+    """
+    Decodes asset files directly.
+    """
+
+    def load(self, path: str) -> Image.Image:
+        """
+        Get the decoded image for a normalized asset path.
+        """
+        return decode(path)
+
+
+def _lookup_indices(
+    bands: typing.Sequence[Image.Image], keys: typing.Sequence[typing.Tuple[int, ...]]
+) -> Image.Image:
+    """
+    Map every pixel to the index in keys of its values in bands, in C.
+    Each band's values are numbered densely and the numbers packed into the top 6 bits of
+    an RGB pixel, which is the granularity Pillow's palette matching caches colors at, so
+    each key gets its own cache cell and matches its own palette entry exactly.
+    :param bands: Mode "L" images, whose dense value numbers fit in 18 bits together.
+    :param keys: Every combination of band values that occurs, at most 256 of them.
+    :return: A mode "P" image of indices into keys.
+    """
+    codes = [
+        {value: code for code, value in enumerate(sorted({key[band] for key in keys}))}
+        for band in range(len(bands))
+    ]
+    offsets: typing.List[int] = []
+    width = 0
+    for code in codes:
+        offsets.append(width)
+        width += (len(code) - 1).bit_length()
+    assert width <= 18
+
+    def pack(key: typing.Tuple[int, ...]) -> int:
+        return sum(
+            code[value] << offset for code, value, offset in zip(codes, key, offsets)
+        )
+
+    channels: typing.List[Image.Image] = []
+    for field in range(0, 18, 6):
+        channel: typing.Optional[Image.Image] = None
+        for band, code, offset in zip(bands, codes, offsets):
+            if offset < field + 6 and offset + (len(code) - 1).bit_length() > field:
+                table = [
+                    ((code.get(v, 0) << offset >> field) & 63) << 2 for v in range(256)
+                ]
+                part = band.point(table)
+                channel = part if channel is None else ImageChops.add(channel, part)
+        channels.append(channel or Image.new("L", bands[0].size))
+    palette = b"".join(
+        bytes(((pack(key) >> field) & 63) << 2 for field in range(0, 18, 6))
+        for key in keys
+    )
+    lookup = Image.new("P", (1, 1))
+    # off the 4-step grid, so unused entries never match exactly
+    lookup.putpalette(palette + b"\x01" * (768 - len(palette)))
+    return Image.merge("RGB", channels).quantize(
+        palette=lookup, dither=Image.Dither.NONE
+    )
+
+
+def to_palette(image: Image.Image) -> typing.Optional[Image.Image]:
+    """
+    Losslessly convert an RGBA image to palette mode, with one RGBA palette entry per color.
+    :return: The palette image, or None if the image has more than 256 colors.
+    """
+    colors = image.getcolors(256)
+    if colors is None:
+        return None
+    keys: typing.List[typing.Tuple[int, ...]] = [color for _, color in colors]
+    bands: typing.List[Image.Image] = list(image.split())
+    # merge bands pairwise until every color's band values can be packed into one lookup
+    while (
+        sum((len({key[b] for key in keys}) - 1).bit_length() for b in range(len(bands)))
+        > 18
+    ):
+        pairs = list(dict.fromkeys(key[:2] for key in keys))
+        numbers = {pair: number for number, pair in enumerate(pairs)}
+        merged = _lookup_indices(bands[:2], pairs)
+        # gray palette, so converting to "L" gives back the indices
+        merged.putpalette(bytes(value for value in range(256) for _ in range(3)))
+        bands[:2] = [merged.convert("L")]
+        keys = [(numbers[key[:2]],) + key[2:] for key in keys]
+    compact = _lookup_indices(bands, keys)
+    compact.putpalette(b"".join(bytes(color) for _, color in colors), "RGBA")
+    difference = ImageChops.difference(compact.convert("RGBA"), image)
+    if any(high for _, high in difference.getextrema()):
+        return None  # shouldn't happen, but output must never change
+    return compact
+
+
+class PaletteAssetStore(AssetStore):
+    """
+    Keeps assets with 256 colors or fewer in palette mode, at 1 byte per pixel instead of 4.
+    Pixel art usually qualifies. AssetResource.get() expands its crop back to RGBA into the
+    shared asset cache, so output is unchanged and the expanded bytes count towards the
+    cache's budget; anything with more colors is kept as RGBA.
+    """
+
+    def __init__(self, store: typing.Optional[AssetStore] = None):
+        """
+        :param store: Where to load images from before converting them. Decodes by default.
+        """
+        self.store = store or AssetStore()
+
+    def load(self, path: str) -> Image.Image:
+        image = self.store.load(path)
+        return to_palette(image) or image
+
+
+class DiskAssetStore(AssetStore):
+    """
+    Keeps raw decoded pixels in a directory and maps them back in instead of decoding again.
+    Mapped files are shared through the OS page cache, so every process using the same
+    directory shares one copy of the pixels.
+    Images loaded from an entry are read-only views of the file.
+    """
+
+    def __init__(self, cache_dir: str, verify_hash: bool = False):
+        """
+        :param cache_dir: Directory to keep decoded assets in. Created if needed.
+        :param verify_hash: Also compare a hash of the source's contents before using an
+                            entry, for filesystems where mtimes can't be trusted.
+        """
+        self.cache_dir = cache_dir
+        self.verify_hash = verify_hash
+
+    def entry_path(self, path: str) -> str:
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(path.encode()).hexdigest() + ".rgba"
+        )
+
+    def load(self, path: str) -> Image.Image:
+        identity = file_identity(path, self.verify_hash)
+        entry_path = self.entry_path(path)
+        image = self._read(entry_path, identity)
+        if image is None:
+            image = decode(path)
+            try:
+                self._write(entry_path, identity, image)
+            except OSError:
+                pass  # still usable, just not cached for next time
+        return image
+
+    def _read(
+        self, entry_path: str, identity: FileIdentity
+    ) -> typing.Optional[Image.Image]:
+        try:
+            with open(entry_path, "rb") as f:
+                size = _unpack_header(f.read(HEADER.size), identity)
+                if size is None:
+                    return None
+                if os.fstat(f.fileno()).st_size != HEADER.size + size[0] * size[1] * 4:
+                    return None
+                # the mapping outlives the file object
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+        return _view(mapped, size)
+
+    def _write(self, entry_path: str, identity: FileIdentity, image: Image.Image):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_pack_header(image, identity))
+                f.write(image.tobytes())
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+# segments that were let go of while images still read from them, closed once they're not
+_retired_segments: typing.List[shared_memory.SharedMemory] = []
+_retired_lock = threading.Lock()
+
+
+def _retire_segment(segment: shared_memory.SharedMemory):
+    """
+    Close a segment, or if images still read from its mapping, keep it open until they're
+    gone; it's closed by a later sweep.
+    """
+    with _retired_lock:
+        _retired_segments.append(segment)
+    _sweep_segments()
+
+
+def _retire_segments(segments: typing.Dict[str, shared_memory.SharedMemory]):
+    for segment in segments.values():
+        _retire_segment(segment)
+    segments.clear()
+
+
+def _sweep_segments():
+    with _retired_lock:
+        retired = list(_retired_segments)
+        _retired_segments.clear()
+    still_used: typing.List[shared_memory.SharedMemory] = []
+    for segment in retired:
+        try:
+            segment.close()
+        except BufferError:
+            # an image still exports the mapping; nothing was closed, so try again later
+            still_used.append(segment)
+    with _retired_lock:
+        _retired_segments.extend(still_used)
+
+
+# names of the segments published by owners in this process
+_published: typing.Set[str] = set()
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    segment = shared_memory.SharedMemory(name)
+    # before 3.13, attaching registers the segment with this process's resource tracker,
+    # which would remove it from under the owner when this process exits; an owner in
+    # this process registered it already, and that registration has to stay
+    if os.name == "posix" and name not in _published:
+        # registered under the POSIX name, which is the public name with a leading slash
+        resource_tracker.unregister("/" + segment.name, "shared_memory")
+    return segment
+
+
+class SharedMemoryAssetStore(AssetStore):
+    """
+    Shares decoded pixels between processes through named shared memory segments.
+
+    One process (the owner, usually a supervisor) decodes each asset once into a segment
+    named after its path. Other processes attach to the segment by name and get an image
+    that reads the shared pixels in place, so memory used by assets doesn't grow with the
+    number of processes. If a segment is missing or out of date, non-owners decode a
+    private copy instead of waiting for the owner.
+
+    Segments live until the owner calls close() (or exits), even if images still use them.
+    """
+
+    def __init__(self, namespace: str = "pxs", owner: bool = False):
+        """
+        :param namespace: Prefix for segment names; processes sharing assets must agree on it.
+        :param owner: Create missing segments, and remove them on close().
+        """
+        self.namespace = namespace
+        self.owner = owner
+        self._segments: typing.Dict[str, shared_memory.SharedMemory] = {}
+        # a dropped store lets go of its segments without cutting off images still using them
+        weakref.finalize(self, _retire_segments, self._segments)
+
+    def segment_name(self, path: str) -> str:
+        # short: macOS limits shared memory names to 31 characters
+        return f"{self.namespace}_{hashlib.sha256(path.encode()).hexdigest()[:16]}"
+
+    def publish(self, path: str) -> str:
+        """
+        Decode an asset into a fresh segment, replacing any previous one.
+        Processes already using the old segment keep their images.
+        :return: The segment's name.
+        """
+        identity = file_identity(path)
+        image = decode(path)
+        name = self.segment_name(path)
+        self._release(path)
+        try:
+            stale = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            pass
+        else:
+            stale.close()
+            stale.unlink()
+        pixels = image.tobytes()
+        segment = shared_memory.SharedMemory(name, True, HEADER.size + len(pixels))
+        _published.add(name)
+        segment.buf[: HEADER.size] = _pack_header(image, identity)
+        segment.buf[HEADER.size : HEADER.size + len(pixels)] = pixels
+        self._segments[path] = segment
+        return name
+
+    def load(self, path: str) -> Image.Image:
+        _sweep_segments()
+        identity = file_identity(path)
+        image = self._attach(path, identity)
+        if image is None:
+            if not self.owner:
+                return decode(path)
+            self.publish(path)
+            image = self._attach(path, identity)
+            assert image is not None
+        return image
+
+    def _attach(
+        self, path: str, identity: FileIdentity
+    ) -> typing.Optional[Image.Image]:
+        segment = self._segments.pop(path, None)
+        if segment is not None:
+            image = self._view(segment, identity)
+            if image is not None:
+                self._segments[path] = segment
+                return image
+            # out of date; the owner may have published a new segment under the same
+            # name since, which only opening the name again will find
+            _retire_segment(segment)
+        try:
+            segment = _open_segment(self.segment_name(path))
+        except FileNotFoundError:
+            return None
+        image = self._view(segment, identity)
+        if image is None:
+            segment.close()  # nothing made from it yet
+            return None
+        self._segments[path] = segment
+        return image
+
+    @staticmethod
+    def _view(
+        segment: shared_memory.SharedMemory, identity: FileIdentity
+    ) -> typing.Optional[Image.Image]:
+        size = _unpack_header(bytes(segment.buf[: HEADER.size]), identity)
+        if size is None or segment.size < HEADER.size + size[0] * size[1] * 4:
+            return None
+        return _view(segment.buf, size)
+
+    def _release(self, path: str):
+        segment = self._segments.pop(path, None)
+        if segment is not None:
+            if self.owner:
+                segment.unlink()
+                _published.discard(segment.name)
+            _retire_segment(segment)
+
+    def close(self):
+        """
+        Stop sharing. The owner removes its segments; images already loaded keep working.
+        """
+        for path in list(self._segments):
+            self._release(path)
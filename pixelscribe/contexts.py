@@ -2,7 +2,7 @@ import typing
 from typing import Union
 
 from pixelscribe import JSONTraceable
-from pixelscribe.json_exception_handler import handle
+from pixelscribe.exceptions import SourceMap
 from pixelscribe.parser.reader import FilePosStorage
 
 
@@ -53,9 +53,39 @@ class JsonFileContext(object):
         return False
 
 
+class CollectJsonErrors(object):
+    def __init__(self, errors: typing.Optional[typing.List[JSONTraceable]]):
+        """
+        @param errors: JSONTraceable errors raised in the block are added to this list and
+                suppressed, so the caller can keep going. If None, errors are raised as usual.
+        """
+        self.errors = errors
+
+    def __enter__(self):
+        return None
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[typing.Type[BaseException]],
+        exc_val: typing.Optional[BaseException],
+        exc_tb: typing.Any,
+    ):
+        if exc_type is None:
+            return
+        if self.errors is not None and issubclass(exc_type, JSONTraceable):
+            self.errors.append(typing.cast(JSONTraceable, exc_val))
+            return True
+        return False
+
+
 class FinalizeJsonErrors:
-    def __init__(self, source_info: typing.Optional[FilePosStorage]):
+    def __init__(
+        self,
+        source_info: typing.Optional[FilePosStorage],
+        source_map: typing.Optional[SourceMap] = None,
+    ):
         self.source_info = source_info
+        self.source_map = source_map
 
     def __enter__(self):
         return None
@@ -70,5 +100,6 @@ class FinalizeJsonErrors:
             return
         if issubclass(exc_type, JSONTraceable):
             exc_val = typing.cast(JSONTraceable, exc_val)
-            exc_val.args = (handle(exc_val, self.source_info),)
+            # formatting waits until something actually shows the error
+            exc_val.set_source_info(self.source_info, self.source_map)
         return False
@@ -1,7 +1,13 @@
+import re
 import typing
+from array import array
+from bisect import bisect_left
 from enum import Enum
 from typing import Tuple, Union
 
+if typing.TYPE_CHECKING:
+    from pixelscribe.parser.reader import FilePosStorage
+
 
 def line_col(source: str, index: int) -> Tuple[int, int]:
     """
@@ -10,6 +16,93 @@ def line_col(source: str, index: int) -> Tuple[int, int]:
     return source.count("\n", 0, index) + 1, index - source.rfind("\n", 0, index)
 
 
+class SourceMap:
+    """
+    The text of a source file, with the offset of every newline so that positions can be
+    turned into lines and columns without rescanning the text.
+    Either give the source text, or a path to read it from (once, the first time it's needed).
+    """
+
+    def __init__(
+        self, source: typing.Optional[str] = None, path: typing.Optional[str] = None
+    ):
+        if source is None and path is None:
+            raise ValueError("SourceMap needs either the source text or a path")
+        self._source = source
+        self.path = path
+        self._newlines: typing.Optional[array[int]] = None
+        # the UTF-8 encoded source and its newline offsets, for converting byte offsets
+        self._encoded: typing.Optional[bytes] = None
+        self._byte_newlines: typing.Optional[array[int]] = None
+
+    @property
+    def source(self) -> str:
+        if self._source is None:
+            assert self.path is not None
+            # no newline translation, so offsets match the bytes on disk
+            with open(self.path, encoding="utf-8", newline="") as f:
+                self._source = f.read()
+        return self._source
+
+    @property
+    def newlines(self) -> "array[int]":
+        if self._newlines is None:
+            self._newlines = array(
+                "l", (m.start() for m in re.finditer("\n", self.source))
+            )
+        return self._newlines
+
+    @property
+    def line_count(self) -> int:
+        if not self.source:
+            return 0
+        if self.source.endswith("\n"):
+            return len(self.newlines)
+        return len(self.newlines) + 1
+
+    def char_index(self, byte_offset: int) -> int:
+        """
+        Convert an offset into the UTF-8 encoded source to an index into the text.
+        Only the line the offset is on gets decoded.
+        """
+        if self._encoded is None or self._byte_newlines is None:
+            self._encoded = self.source.encode("utf-8")
+            self._byte_newlines = array(
+                "l", (m.start() for m in re.finditer(b"\n", self._encoded))
+            )
+        line = bisect_left(self._byte_newlines, byte_offset)
+        if line == 0:
+            line_start, line_start_char = 0, 0
+        else:
+            line_start = self._byte_newlines[line - 1] + 1
+            line_start_char = self.newlines[line - 1] + 1
+        text = self._encoded[line_start:byte_offset].decode("utf-8", errors="replace")
+        return line_start_char + len(text)
+
+    def line_col(self, index: int) -> Tuple[int, int]:
+        """
+        Return the line and column number of the given index, like line_col().
+        """
+        line = bisect_left(self.newlines, index)
+        line_start = self.newlines[line - 1] + 1 if line > 0 else 0
+        return line + 1, index - line_start + 1
+
+    def line(self, number: int) -> str:
+        """
+        Get the text of a line (1-indexed), without its line ending.
+        """
+        start = self.newlines[number - 2] + 1 if number > 1 else 0
+        end = (
+            self.newlines[number - 1]
+            if number - 1 < len(self.newlines)
+            else len(self.source)
+        )
+        text = self.source[start:end]
+        if text.endswith("\r"):
+            text = text[:-1]
+        return text
+
+
 class JSONTraceable(Exception):
     """
     Base class for exceptions that can be traced back to JSON.
@@ -34,12 +127,86 @@ class JSONTraceable(Exception):
                 f"JSON path should be a string or a list, not {type(json_path).__name__}"
             )
         self.source_file: typing.Optional[str] = None
+        # set once the error leaves the importer; until then str() is just the message
+        self.file_map: typing.Optional["FilePosStorage"] = None
+        self.source_map: typing.Optional[SourceMap] = None
+        self.finalized = False
+        self._rendered: typing.Optional[str] = None
 
     def extend(self, key: typing.Union[str, int]):
         self.json_path.insert(0, key)
+        self._rendered = None
 
     def set_source_file(self, source_file: str):
         self.source_file = source_file
+        self._rendered = None
+
+    def set_source_info(
+        self,
+        file_map: typing.Optional["FilePosStorage"],
+        source_map: typing.Optional[SourceMap] = None,
+    ):
+        """
+        Attach what's needed to point at the error in the source file.
+        Nothing is looked up or formatted until the error is shown.
+        """
+        self.file_map = file_map
+        self.source_map = source_map
+        self.finalized = True
+        self._rendered = None
+
+    @property
+    def offset(self) -> typing.Optional[int]:
+        """
+        Position of the error in the source file (in bytes if the file map counts bytes).
+        """
+        if self.file_map is None:
+            return None
+        try:
+            return self.file_map.get(self.json_path)
+        except KeyError:
+            return None
+
+    @property
+    def line_col(self) -> typing.Optional[Tuple[int, int]]:
+        offset = self.offset
+        if offset is None or self.source_map is None:
+            return None
+        assert self.file_map is not None
+        if self.file_map.byte_offsets:
+            offset = self.source_map.char_index(offset)
+        return self.source_map.line_col(offset)
+
+    def render(self, color: bool = True) -> str:
+        """
+        Format the error with its location and the surrounding source lines.
+        """
+        # imported here because the handler imports this module
+        from pixelscribe.json_exception_handler import handle
+
+        return handle(self, self.file_map, self.source_map, color)
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """
+        A JSON-friendly summary of the error, for tools. Doesn't format anything.
+        """
+        line_col = self.line_col
+        return {
+            "message": self.args[0] if self.args else "",
+            "code": None,
+            "path": list(self.json_path),
+            "file": self.source_file,
+            "offset": self.offset,
+            "line": line_col[0] if line_col else None,
+            "column": line_col[1] if line_col else None,
+        }
+
+    def __str__(self) -> str:
+        if not self.finalized:
+            return super().__str__()
+        if self._rendered is None:
+            self._rendered = self.render()
+        return self._rendered
 
 
 class ValidationError(JSONTraceable):
@@ -67,3 +234,51 @@ class ValidationError(JSONTraceable):
             json_path,
         )
         self.error_code = error_code
+        self.detail = message
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        result = super().to_dict()
+        result["message"] = self.detail
+        result["code"] = self.error_code
+        return result
+
+
+class ValidationErrorGroup(JSONTraceable):
+    """
+    Several JSONTraceable errors found in one pass, raised together.
+    """
+
+    def __init__(self, errors: typing.List[JSONTraceable]):
+        super().__init__(
+            f"{len(errors)} error{'' if len(errors) == 1 else 's'} found", ""
+        )
+        self.errors = errors
+
+    def extend(self, key: typing.Union[str, int]):
+        super().extend(key)
+        for error in self.errors:
+            error.extend(key)
+
+    def set_source_file(self, source_file: str):
+        super().set_source_file(source_file)
+        for error in self.errors:
+            error.set_source_file(source_file)
+
+    def set_source_info(
+        self,
+        file_map: typing.Optional["FilePosStorage"],
+        source_map: typing.Optional[SourceMap] = None,
+    ):
+        super().set_source_info(file_map, source_map)
+        for error in self.errors:
+            error.set_source_info(file_map, source_map)
+
+    def render(self, color: bool = True) -> str:
+        return "\n".join(
+            [self.args[0]] + [error.render(color) for error in self.errors]
+        )
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        result = super().to_dict()
+        result["errors"] = [error.to_dict() for error in self.errors]
+        return result
@@ -10,6 +10,7 @@ from pixelscribe import (
     FeatureOverride,
     ValidationError,
     check_feature,
+    fill_tiles,
     next_multiple,
     odd,
 )
@@ -138,31 +139,43 @@ class Feature1D(Feature):
         self.overrides: typing.Dict[int, Feature1DOverride] = {
             o.x: o for o in (overrides or [])
         }
+        # rotated override images for vertical tiling, by override id: (source, rotated)
+        self._rotated: typing.Dict[int, typing.Tuple[Image.Image, Image.Image]] = {}
 
     @property
     def parallel(self) -> int:
         if self.direction == Direction.HORIZONTAL:
-            return self.source.width
-        return self.source.height
+            return self._asset.width
+        return self._asset.height
 
     @property
     def perpendicular(self) -> int:
         if self.direction == Direction.HORIZONTAL:
-            return self.source.height
-        return self.source.width
+            return self._asset.height
+        return self._asset.width
 
-    def tile(self, length: int):
+    def assets(self) -> typing.List[AssetResource]:
+        return [self._asset] + [o.asset for o in self.overrides.values()]
+
+    def tile(self, length: int, previous: typing.Optional[Image.Image] = None):
         """
         Tile the asset to the given length.
         :param length: The length to tile to.
+        :param previous: An earlier result of tile() from this feature, to crop or extend
+                         instead of tiling from scratch when its tiles line up with this one.
+                         They do if it's the same length, or if the feature is start
+                         justified, since then tiles are laid out from the start whatever
+                         the length.
         :return: The tiled image.
         """
         img = self._asset.get()
-        if self.direction == Direction.VERTICAL:
-            img = img.transpose(Image.ROTATE_90)
+        vertical = self.direction == Direction.VERTICAL
+        # tiles are laid out along the length directly, down the canvas if vertical
+        step = img.height if vertical else img.width
+        across = img.width if vertical else img.height
         # Round up to the next multiple of the asset size...
-        tiled = Image.new("RGBA", (odd(next_multiple(length, img.width)), img.height))
-        tile_count = tiled.width // img.width
+        total = odd(next_multiple(length, step))
+        tile_count = total // step
         # Calculate the "origin" tile
         center_pos = 0
         if self.justify == Justify1D.CENTER:
@@ -170,27 +183,134 @@ class Feature1D(Feature):
         elif self.justify == Justify1D.END:
             center_pos = tile_count - 1
 
-        # Paste that thing all over the place
-        for x in range(tile_count):
-            vx = x - center_pos
-            if vx in self.overrides:
-                override = self.overrides[vx]
-                tiled.paste(override.asset.get(), (x * img.width, 0))
-            else:
-                tiled.paste(img, (x * img.width, 0))
-
-        # Crop to the desired size using the justification
+        # Where the requested length sits on that rounded up strip, using the justification
         crop_from = 0
         if self.justify == Justify1D.CENTER:
-            crop_from = (tiled.width - length) // 2
+            crop_from = (total - length) // 2
         elif self.justify == Justify1D.END:
-            crop_from = tiled.width - length
-        crop_to = crop_from + length
-        tiled = tiled.crop((crop_from, 0, crop_to, img.height))
-        if self.direction == Direction.VERTICAL:
-            tiled = tiled.transpose(Image.ROTATE_270)
+            crop_from = total - length
+
+        # Reuse as much of the previous result as lines up
+        done = 0
+        if previous is not None:
+            done = previous.height if vertical else previous.width
+            previous_across = previous.width if vertical else previous.height
+            if previous_across != across or (
+                done != length and self.justify != Justify1D.START
+            ):
+                done = 0
+        size = (across, length) if vertical else (length, across)
+        if previous is not None and done:
+            # pads with empty space if it's shorter
+            tiled = previous.crop((0, 0) + size)
+        else:
+            tiled = Image.new("RGBA", size)
+        if done >= length:
+            return tiled
+
+        # Only draw the rest: paste that thing all over it.
+        # Past the last whole tile (the odd rounding can leave a spare pixel) stays empty.
+        rest = tiled
+        if done:
+            rest = Image.new(
+                "RGBA", (across, length - done) if vertical else (length - done, across)
+            )
+        start = crop_from + done
+        filled = min(length - done, tile_count * step - start)
+        if vertical:
+            fill_tiles(rest, img, across, filled, (0, start))
+        else:
+            fill_tiles(rest, img, filled, across, (start, 0))
+        self._paste_overrides(rest, center_pos, tile_count, step, total, start)
+        if rest is not tiled:
+            tiled.paste(rest, (0, done) if vertical else (done, 0))
         return tiled
 
+    def _override_image(self, override: Feature1DOverride) -> Image.Image:
+        """
+        The override image as it's laid along the length of the tiled strip.
+        """
+        image = override.asset.get()
+        if self.direction == Direction.HORIZONTAL:
+            return image
+        # vertical strips used to be tiled sideways and turned upright at the end,
+        # which turned overrides (pasted in unturned) clockwise; keep them that way
+        cached = self._rotated.get(id(override))
+        if cached is None or cached[0] is not image:
+            cached = image, image.transpose(Image.ROTATE_270)
+            self._rotated[id(override)] = cached
+        return cached[1]
+
+    def _paste_overrides(
+        self,
+        tiled: Image.Image,
+        center_pos: int,
+        tile_count: int,
+        step: int,
+        total: int,
+        crop_from: int,
+    ):
+        """
+        Paste the overrides over the plain tiles in their cells.
+        Tiles used to be pasted one after another, so an override that doesn't fit its
+        cell leaves part of it empty, or spills into later cells until the next plain
+        tile covers it up. Each cell an override touches (and the spare space past the
+        last tile) is redone with just the overrides that reach it, in order.
+        Cells are numbered on the full rounded up strip, which starts crop_from before tiled.
+        """
+        vertical = self.direction == Direction.VERTICAL
+        across = tiled.width if vertical else tiled.height
+        length = tiled.height if vertical else tiled.width
+        placed: typing.List[typing.Tuple[int, Image.Image]] = sorted(
+            (
+                (vx + center_pos, self._override_image(override))
+                for vx, override in self.overrides.items()
+                if 0 <= vx + center_pos < tile_count
+            ),
+            key=lambda item: item[0],
+        )
+        if not placed:
+            return
+        cells = [x for x, _ in placed]
+        if total > tile_count * step:
+            cells.append(tile_count)
+        for cell in cells:
+            start = max(cell * step, crop_from)
+            end = min(
+                cell * step + step if cell < tile_count else total, crop_from + length
+            )
+            if start >= end:
+                continue
+            if vertical:
+                tiled.paste(
+                    (0, 0, 0, 0), (0, start - crop_from, across, end - crop_from)
+                )
+            else:
+                tiled.paste(
+                    (0, 0, 0, 0), (start - crop_from, 0, end - crop_from, across)
+                )
+            for x, image in placed:
+                if x > cell:
+                    break
+                image_start = x * step
+                image_length = image.height if vertical else image.width
+                lo = max(start, image_start)
+                hi = min(end, image_start + image_length)
+                if lo >= hi:
+                    continue
+                if vertical:
+                    part = image.crop(
+                        (0, lo - image_start, image.width, hi - image_start)
+                    )
+                    # the old sideways strip lined overrides up with its top edge,
+                    # which becomes the right edge once it's upright
+                    tiled.paste(part, (across - image.width, lo - crop_from))
+                else:
+                    part = image.crop(
+                        (lo - image_start, 0, hi - image_start, image.height)
+                    )
+                    tiled.paste(part, (lo - crop_from, 0))
+
     @classmethod
     def import_(cls, json_body: JSON, theme_directory: typing.Optional[str] = None):
         if not isinstance(json_body, dict):
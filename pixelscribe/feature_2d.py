@@ -11,6 +11,7 @@ from pixelscribe import (
     FeatureOverride,
     ValidationError,
     check_feature,
+    fill_tiles,
     get_justify,
     next_multiple,
     odd,
@@ -123,11 +124,15 @@ class Feature2D(Feature):
         self._overrides: typing.Dict[typing.Tuple[int, int], Feature2DOverride] = {
             (o.x, o.y): o for o in (overrides or [])
         }
+        # the same overrides by row, then column, so tiling only looks at rows it draws
+        self._override_rows: typing.Dict[int, typing.Dict[int, Feature2DOverride]] = {}
+        for (x, y), override in self._overrides.items():
+            self._override_rows.setdefault(y, {})[x] = override
         for override in self._overrides.values():
-            if override.asset.get().size != self._asset.get().size:
+            if override.asset.size != self._asset.size:
                 raise ValueError(
                     "Override asset size must match the base asset size.\n    "
-                    f"got {override.asset.get().size}, expected {self._asset.get().size}\n    "
+                    f"got {override.asset.size}, expected {self._asset.size}\n    "
                     "(hint: try resizing the override with the 'crop' option)\n    "
                     "(hint: if you don't want to do that, use an overlay instead)"
                 )
@@ -136,23 +141,30 @@ class Feature2D(Feature):
     def justify(self) -> typing.Tuple[Justify2D.X, Justify2D.Y]:
         return self.justifyX, self.justifyY
 
-    def tile(self, width: int, height: int):
+    def assets(self) -> typing.List[AssetResource]:
+        return [self._asset] + [o.asset for o in self._overrides.values()]
+
+    def tile(
+        self, width: int, height: int, previous: typing.Optional[Image.Image] = None
+    ):
         """
         Tile the asset to the given dimensions.
         :param width: The width to tile to.
         :param height: The height to tile to.
+        :param previous: An earlier result of tile() from this feature, to crop or extend
+                         instead of tiling from scratch when its tiles line up with this one.
+                         They do if each dimension is either the same as before, or left
+                         (or top) justified, since then tiles are laid out from that edge
+                         whatever the size.
         :return: The tiled image.
         """
         img = self._asset.get()
         # Round up to the next multiple of the asset size...
-        tiled = Image.new(
-            "RGBA",
-            (
-                odd(next_multiple(width, img.width)),
-                odd(next_multiple(height, img.height)),
-            ),
+        total = (
+            odd(next_multiple(width, img.width)),
+            odd(next_multiple(height, img.height)),
         )
-        tile_count = tiled.width // img.width, tiled.height // img.height
+        tile_count = total[0] // img.width, total[1] // img.height
         # Calculate the "origin" tile
         center_pos = [0, 0]
         if self.justifyX == Justify2D.X.CENTER:
@@ -164,30 +176,84 @@ class Feature2D(Feature):
         elif self.justifyY == Justify2D.Y.BOTTOM:
             center_pos[1] = tile_count[1] - 1
 
-        # Paste that thing all over the place
-        for x in range(tile_count[0]):
-            for y in range(tile_count[1]):
-                vx, vy = x - center_pos[0], y - center_pos[1]
-                if (vx, vy) in self._overrides:
-                    override = self._overrides[(vx, vy)]
-                    tiled.paste(override.asset.get(), (x * img.width, y * img.height))
-                else:
-                    tiled.paste(img, (x * img.width, y * img.height))
-
-        # Crop to the desired size using the justification
+        # Where the requested area sits on that rounded up grid, using the justification
         crop_from = [0, 0]
         if self.justifyX == Justify2D.X.CENTER:
-            crop_from[0] = (tiled.width - width) // 2
+            crop_from[0] = (total[0] - width) // 2
         elif self.justifyX == Justify2D.X.RIGHT:
-            crop_from[0] = tiled.width - width
+            crop_from[0] = total[0] - width
         if self.justifyY == Justify2D.Y.CENTER:
-            crop_from[1] = (tiled.height - height) // 2
+            crop_from[1] = (total[1] - height) // 2
         elif self.justifyY == Justify2D.Y.BOTTOM:
-            crop_from[1] = tiled.height - height
-        crop_to = [crop_from[0] + width, crop_from[1] + height]
-        tiled = tiled.crop((crop_from[0], crop_from[1], crop_to[0], crop_to[1]))
+            crop_from[1] = total[1] - height
+
+        if previous is None or not (
+            (previous.width == width or self.justifyX == Justify2D.X.LEFT)
+            and (previous.height == height or self.justifyY == Justify2D.Y.TOP)
+        ):
+            tiled = Image.new("RGBA", (width, height))
+            self._draw_area(tiled, img, tile_count, center_pos, crop_from)
+            return tiled
+
+        # Reuse as much of the previous result as lines up (cropping pads with empty
+        # space if it's smaller), and only draw the new columns and rows
+        tiled = previous.crop((0, 0, width, height))
+        if width > previous.width:
+            rest = Image.new("RGBA", (width - previous.width, height))
+            origin = [crop_from[0] + previous.width, crop_from[1]]
+            self._draw_area(rest, img, tile_count, center_pos, origin)
+            tiled.paste(rest, (previous.width, 0))
+        if height > previous.height:
+            rest = Image.new(
+                "RGBA", (min(width, previous.width), height - previous.height)
+            )
+            origin = [crop_from[0], crop_from[1] + previous.height]
+            self._draw_area(rest, img, tile_count, center_pos, origin)
+            tiled.paste(rest, (0, previous.height))
         return tiled
 
+    def _draw_area(
+        self,
+        area: Image.Image,
+        img: Image.Image,
+        tile_count: typing.Tuple[int, int],
+        center_pos: typing.List[int],
+        origin: typing.List[int],
+    ):
+        """
+        Draw the part of the rounded up grid of tiles that starts at origin onto area.
+        """
+        # Paste that thing all over it: one row of tiles, copied down the area.
+        # Past the last whole tile (the odd rounding can leave a spare pixel) stays empty.
+        fill_tiles(
+            area,
+            img,
+            min(area.width, tile_count[0] * img.width - origin[0]),
+            min(area.height, tile_count[1] * img.height - origin[1]),
+            (origin[0], origin[1]),
+        )
+        # Then patch in the overrides, in the cells of the grid that the area shows.
+        # Overrides are the size of a tile, so each one only covers its own cell.
+        columns = (
+            max(0, origin[0] // img.width),
+            min(tile_count[0], -(-(origin[0] + area.width) // img.width)),
+        )
+        rows = (
+            max(0, origin[1] // img.height),
+            min(tile_count[1], -(-(origin[1] + area.height) // img.height)),
+        )
+        for vy, row in self._override_rows.items():
+            y = vy + center_pos[1]
+            if not rows[0] <= y < rows[1]:
+                continue
+            for vx, override in row.items():
+                x = vx + center_pos[0]
+                if columns[0] <= x < columns[1]:
+                    area.paste(
+                        override.asset.get(),
+                        (x * img.width - origin[0], y * img.height - origin[1]),
+                    )
+
     @classmethod
     def import_(cls, json_body: JSON, theme_directory: typing.Optional[str] = None):
         if not isinstance(json_body, dict):
@@ -5,7 +5,8 @@ import typing
 # noinspection PyUnresolvedReferences
 from colorama import Fore, Style, just_fix_windows_console
 
-from pixelscribe import JSONTraceable, exceptions
+from pixelscribe import JSONTraceable
+from pixelscribe.exceptions import SourceMap
 from pixelscribe.parser.reader import FilePosStorage
 
 just_fix_windows_console()
@@ -14,21 +15,42 @@ just_fix_windows_console()
 CONTEXT = 5
 
 
-def handle(exception: JSONTraceable, import_data: typing.Optional[FilePosStorage]):
+def handle(
+    exception: JSONTraceable,
+    import_data: typing.Optional[FilePosStorage],
+    source_map: typing.Optional[SourceMap] = None,
+    color: bool = True,
+):
+    highlight, reset = (
+        (f"{Fore.YELLOW}{Style.BRIGHT}", Style.RESET_ALL) if color else ("", "")
+    )
     result = ""
     result += exception.args[0] + "\n"  # message
     nice_filename = "<unknown>"
-    source = None
+    source: typing.Optional[SourceMap] = None
     line_col = (0, 0)
     if exception.source_file:
-        if os.path.exists(exception.source_file):
+        if source_map is None and os.path.exists(exception.source_file):
+            # the importer didn't give us the source, so read it back from disk
+            if import_data is not None and import_data.byte_offsets:
+                source_map = SourceMap(path=exception.source_file)
+            else:
+                with open(exception.source_file) as f:
+                    source_map = SourceMap(f.read())
+        if source_map is not None:
             nice_filename = os.path.abspath(exception.source_file)
-            if import_data:
-                with open(nice_filename) as f:
-                    source = f.read()
-                line_col = exceptions.line_col(
-                    source, import_data.get(exception.json_path)
-                )
+            position: typing.Optional[int] = None
+            if import_data is not None:
+                try:
+                    position = import_data.get(exception.json_path)
+                except KeyError:
+                    pass  # no position for this path; just don't show the source
+            if position is not None:
+                assert import_data is not None
+                source = source_map
+                if import_data.byte_offsets:
+                    position = source_map.char_index(position)
+                line_col = source_map.line_col(position)
 
     nice_error_path = (
         ".".join(map(str, exception.json_path))
@@ -36,13 +58,12 @@ def handle(exception: JSONTraceable, import_data: typing.Optional[FilePosStorage
         else "<root object>"
     )
     error_locator_header_line = f"  at {nice_error_path}" f' in "{nice_filename}"'
-    if source:
+    if source is not None:
         error_locator_header_line += f", line {line_col[0]} (column {line_col[1]})"
     result += error_locator_header_line + "\n"
     # if the file exists, try to start reading it...
-    if source:
-        # read by lines
-        lines = source.splitlines()
+    if source is not None:
+        line_count = source.line_count
         lineno_width = len(str(line_col[0])) + 1
         # print two lines before the error
         for i in range(line_col[0] - CONTEXT, line_col[0] + CONTEXT + 1):
@@ -52,20 +73,22 @@ def handle(exception: JSONTraceable, import_data: typing.Optional[FilePosStorage
                     linebar = " ↑"
                 else:
                     linebar = " \u2577"
-            if i == line_col[0] + CONTEXT or i == len(lines):
-                if i != len(lines):
+            if i == line_col[0] + CONTEXT or i == line_count:
+                if i != line_count:
                     linebar = " ↓"
                 else:
                     linebar = " \u2575"
             if i == line_col[0]:
                 linebar = "->"
-            if 0 < i <= len(lines):
+            if 0 < i <= line_count:
                 if i == line_col[0]:
                     result += (
-                        f"{Fore.YELLOW}{Style.BRIGHT}{str(i).rjust(lineno_width)}{linebar}"
-                        f"{lines[i-1]}{Style.RESET_ALL}\n"
+                        f"{highlight}{str(i).rjust(lineno_width)}{linebar}"
+                        f"{source.line(i)}{reset}\n"
                     )
                 else:
-                    result += f"{str(i).rjust(lineno_width)}{linebar} {lines[i-1]}\n"
+                    result += (
+                        f"{str(i).rjust(lineno_width)}{linebar} {source.line(i)}\n"
+                    )
     # ...
     return result
@@ -0,0 +1,142 @@
+"""
+Counters for asset loading, kept process-wide and for whichever themes are active.
+
+A theme becomes active for the duration of a CollectAssetStats block (Theme.import_ and
+Theme.draw open one), so loads are counted towards the theme that caused them.
+"""
+
+import contextvars
+import threading
+import typing
+
+from PIL import Image
+
+from .asset_cache import image_bytes
+
+
+class AssetLoad(typing.NamedTuple):
+    """
+    One decoded asset, as passed to the load callback.
+    """
+
+    path: str
+    size: typing.Tuple[int, int]
+    bytes: int
+    seconds: float
+
+
+class AssetStats(object):
+    def __init__(self):
+        # loads served from the cache, and loads that had to decode
+        self.hits = 0
+        self.misses = 0
+        self.decode_seconds = 0.0
+        self.decoded_bytes = 0
+        # the biggest single decode, to spot oversized images
+        self.largest_path: typing.Optional[str] = None
+        self.largest_bytes = 0
+        # only filled in on snapshots: bytes of decoded images held right now
+        self.resident_bytes = 0
+
+    def __repr__(self) -> str:
+        return f"AssetStats({self.as_dict()!r})"
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "decode_seconds": self.decode_seconds,
+            "decoded_bytes": self.decoded_bytes,
+            "largest_path": self.largest_path,
+            "largest_bytes": self.largest_bytes,
+            "resident_bytes": self.resident_bytes,
+        }
+
+    def snapshot(self, resident_bytes: int) -> "AssetStats":
+        with _lock:
+            copy = AssetStats()
+            copy.__dict__.update(self.__dict__)
+        copy.resident_bytes = resident_bytes
+        return copy
+
+    def reset(self):
+        with _lock:
+            self.__init__()
+
+    def _add_load(self, load: AssetLoad):
+        self.misses += 1
+        self.decode_seconds += load.seconds
+        self.decoded_bytes += load.bytes
+        if load.bytes > self.largest_bytes:
+            self.largest_path, self.largest_bytes = load.path, load.bytes
+
+
+_lock = threading.Lock()
+process_stats = AssetStats()
+_active: "contextvars.ContextVar[typing.Tuple[AssetStats, ...]]" = (
+    contextvars.ContextVar("pixelscribe_asset_stats", default=())
+)
+_callback: typing.Optional[typing.Callable[[AssetLoad], None]] = None
+
+
+def set_load_callback(
+    callback: typing.Optional[typing.Callable[[AssetLoad], None]]
+) -> typing.Optional[typing.Callable[[AssetLoad], None]]:
+    """
+    Call a function after every asset decode, or stop calling it with None.
+    It runs on the thread that decoded the asset.
+    :return: The previous callback.
+    """
+    global _callback
+    previous, _callback = _callback, callback
+    return previous
+
+
+def record_hit():
+    with _lock:
+        process_stats.hits += 1
+        for stats in _active.get():
+            stats.hits += 1
+
+
+def record_decode(path: str, image: Image.Image, seconds: float):
+    load = AssetLoad(path, image.size, image_bytes(image), seconds)
+    with _lock:
+        process_stats._add_load(load)
+        for stats in _active.get():
+            stats._add_load(load)
+    callback = _callback
+    if callback is not None:
+        callback(load)
+
+
+class CollectAssetStats(object):
+    def __init__(self, stats: AssetStats):
+        """
+        @param stats: Counted towards, as well as the process-wide stats, by loads in the block.
+        """
+        self.stats = stats
+        self._token: typing.Optional[contextvars.Token[typing.Tuple[AssetStats, ...]]]
+        self._token = None
+
+    def __enter__(self):
+        active = _active.get()
+        if self.stats not in active:
+            self._token = _active.set(active + (self.stats,))
+        return self.stats
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[typing.Type[BaseException]],
+        exc_val: typing.Optional[BaseException],
+        exc_tb: typing.Any,
+    ):
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+        return False
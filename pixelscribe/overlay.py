@@ -176,16 +176,19 @@ class Overlay:
 
     @property
     def width(self):
-        return self.source.width
+        return self._asset.width
 
     @property
     def height(self):
-        return self.source.height
+        return self._asset.height
 
     @property
     def source(self):
         return self._asset.get()
 
+    def assets(self) -> typing.List[AssetResource]:
+        return [self._asset]
+
     @classmethod
     def import_(cls, json_body: JSON, theme_directory: typing.Optional[str] = None):
         if not isinstance(json_body, dict):
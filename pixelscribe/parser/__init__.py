@@ -1,3 +1,3 @@
-from .reader import loads
+from .reader import load, loads, loads_deferred
 
-__all__ = ["loads"]
+__all__ = ["load", "loads", "loads_deferred"]
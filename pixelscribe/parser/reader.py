@@ -1,8 +1,12 @@
 # https://json.org/json-en.html
 
 
+import json
 import re
+import sys
 import typing
+from array import array
+from mmap import mmap
 from pprint import pprint as rp
 
 from .json_types import JSON, JSONArray, JSONObject
@@ -12,322 +16,696 @@ MutableJsonPath = typing.List[typing.Union[str, int]]
 JsonPath = typing.Union[MutableJsonPath, FrozenJsonPath]
 
 
-class StringStream:
-    def __init__(self, source: str):
-        self.source = source
-        self.cur = 0
-
-    def read(
-        self, count: typing.Optional[int] = None, error_overrun_end: bool = True
-    ) -> str:
-        if count is None:
-            count = len(self.source) - self.cur
-        if count + self.cur > len(self.source) and error_overrun_end:
-            raise ValueError(
-                f"Read overran end of stream (reading {count}, position {self.cur})"
-            )
-        result = self.source[self.cur : self.cur + count]
-        self.cur += count
-        return result
-
-    def tell(self) -> int:
-        return self.cur
+JsonKey = typing.Union[str, int]
 
-    def peek(self):
-        """
-        Return the remainder of the stream without moving the cursor
-        """
-        return self.source[self.cur :]
 
-    def seek(self, to: int):
-        if to < 0 or to > len(self.source):
-            raise ValueError(f"cannot seek to position {to}")
-        self.cur = to
-
-    def rewind(self, by: int):
-        self.seek(self.cur - by)
-
-    def eof(self):
-        return self.cur >= len(self.source)
+class FilePosStorage:
+    """
+    Maps JSON paths to the file position of the value at that path.
+    Paths are stored as a trie of node ids. The children of each container are listed in
+    order in one shared array, objects add a tuple of their keys in the same order, and file
+    positions and parent links live in flat arrays indexed by node id.
+    """
 
+    ROOT = 0
+    UNKNOWN = -1
 
-class FilePosStorage:
     def __init__(self):
-        self.positions: typing.Dict[FrozenJsonPath, int] = {}
+        self._offsets = array("l", [self.UNKNOWN])
+        # node ids always fit in 32 bits
+        self._parents = array("i", [self.UNKNOWN])
+        # for containers, where their child list starts in _elements; UNKNOWN otherwise
+        self._element_lists = array("i", [self.UNKNOWN])
+        # child lists, one after another: the count, then the children's node ids
+        self._elements = array("i")
+        # for objects, their keys in the order of the child list; objects in themes are
+        # small, so looking a key up in a tuple is fine and much smaller than a dict
+        self._keys: typing.Dict[int, typing.Tuple[str, ...]] = {}
+        # children that were put one at a time, by key
+        self._children: typing.Dict[int, typing.Dict[JsonKey, int]] = {}
+        # positions count bytes (from load) rather than characters (from loads)
+        self.byte_offsets = False
+
+    def __len__(self) -> int:
+        return sum(1 for offset in self._offsets if offset != self.UNKNOWN)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the storage, not counting the (shared) key objects.
+        """
+        return (
+            sys.getsizeof(self._offsets)
+            + sys.getsizeof(self._parents)
+            + sys.getsizeof(self._element_lists)
+            + sys.getsizeof(self._elements)
+            + sys.getsizeof(self._keys)
+            + sum(sys.getsizeof(keys) for keys in self._keys.values())
+            + sys.getsizeof(self._children)
+            + sum(sys.getsizeof(children) for children in self._children.values())
+        )
+
+    def _items(self, node: int) -> typing.Iterator[typing.Tuple[JsonKey, int]]:
+        """
+        The (key, node id) of every child of node.
+        """
+        start = self._element_lists[node]
+        if start != self.UNKNOWN:
+            keys = self._keys.get(node)
+            if keys is None:
+                count = self._elements[start]
+                yield from enumerate(self._elements[start + 1 : start + 1 + count])
+            else:
+                for index, key in enumerate(keys):
+                    yield key, self._elements[start + 1 + index]
+        yield from self._children.get(node, {}).items()
+
+    def _child(self, node: int, key: JsonKey) -> typing.Optional[int]:
+        start = self._element_lists[node]
+        if start != self.UNKNOWN:
+            keys = self._keys.get(node)
+            if keys is None:
+                if isinstance(key, int) and 0 <= key < self._elements[start]:
+                    return self._elements[start + 1 + key]
+            elif isinstance(key, str) and key in keys:
+                # duplicate keys are rejected, so the first match is the only one
+                return self._elements[start + 1 + keys.index(key)]
+        children = self._children.get(node)
+        if children is None:
+            return None
+        return children.get(key)
+
+    def _path_of(self, node: int) -> MutableJsonPath:
+        path: MutableJsonPath = []
+        while node != self.ROOT:
+            parent = self._parents[node]
+            for key, child in self._items(parent):
+                if child == node:
+                    path.insert(0, key)
+                    break
+            node = parent
+        return path
+
+    def _find(self, path_to: JsonPath) -> typing.Optional[int]:
+        node: typing.Optional[int] = self.ROOT
+        for key in path_to:
+            node = self._child(node, key)
+            if node is None:
+                return None
+        return node
+
+    def add_node(self, parent: int, position: int) -> int:
+        """
+        Record the position of a value under parent, without giving it a key yet.
+        set_elements then lists a container's children all at once.
+        :return: The node id of the value.
+        """
+        node = len(self._offsets)
+        self._offsets.append(position)
+        self._parents.append(parent)
+        self._element_lists.append(self.UNKNOWN)
+        return node
+
+    def set_elements(
+        self,
+        parent: int,
+        nodes: typing.Sequence[int],
+        keys: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        """
+        Make nodes (from add_node) the children of the container at parent.
+        :param keys: For objects, the key of each node, in the same order.
+                     Arrays are indexed by position.
+        """
+        self._element_lists[parent] = len(self._elements)
+        self._elements.append(len(nodes))
+        self._elements.extend(nodes)
+        if keys is not None:
+            self._keys[parent] = tuple(keys)
+
+    def put_child(
+        self, parent: int, key: JsonKey, position: int, allow_overwrite: bool = False
+    ) -> int:
+        """
+        Record the position of the value at key under the node parent.
+        :return: The node id of the child, to put its own children under.
+        """
+        node = self._child(parent, key)
+        if node is None:
+            node = self.add_node(parent, position)
+            children = self._children.get(parent)
+            if children is None:
+                children = self._children[parent] = {}
+            children[sys.intern(key) if isinstance(key, str) else key] = node
+            return node
+        if self._offsets[node] != self.UNKNOWN and not allow_overwrite:
+            raise KeyError(
+                f"Path already assigned a file position: {self._path_of(node)}; it is at {self._offsets[node]}"
+            )
+        self._offsets[node] = position
+        return node
 
     def put(self, path_to: JsonPath, position: int, allow_overwrite: bool = False):
-        # freeze
-        fzn: FrozenJsonPath = tuple(path_to)
-        if fzn in self.positions and not allow_overwrite:
+        node = self.ROOT
+        for key in path_to:
+            node = self.put_child(node, key, self.UNKNOWN, True)
+        if self._offsets[node] != self.UNKNOWN and not allow_overwrite:
             raise KeyError(
-                f"Path already assigned a file position: {path_to}; it is at {self.positions[fzn]}"
+                f"Path already assigned a file position: {path_to}; it is at {self._offsets[node]}"
             )
-        self.positions[fzn] = position
+        self._offsets[node] = position
 
     def get(self, path_to: JsonPath) -> int:
-        fzn: FrozenJsonPath = tuple(path_to)
-        if fzn not in self.positions:
+        node = self._find(path_to)
+        if node is None or self._offsets[node] == self.UNKNOWN:
             raise KeyError(f"Path not found: {path_to}")
-        return self.positions[fzn]
+        return self._offsets[node]
+
+    @property
+    def positions(self) -> typing.Dict[FrozenJsonPath, int]:
+        """
+        Every known position, keyed by frozen path. Built on demand; mostly useful for debugging.
+        """
+        result: typing.Dict[FrozenJsonPath, int] = {}
+        stack: typing.List[typing.Tuple[int, FrozenJsonPath]] = [(self.ROOT, ())]
+        while stack:
+            node, path = stack.pop()
+            if self._offsets[node] != self.UNKNOWN:
+                result[path] = self._offsets[node]
+            for key, child in self._items(node):
+                stack.append((child, path + (key,)))
+        return result
+
+
+class Token(typing.NamedTuple):
+    """
+    A single JSON token and the offset it starts at in the source.
+    kind is one of "{", "}", "[", "]", ":", ",", or "value" (strings, numbers and literals).
+    """
+
+    kind: str
+    value: JSON
+    start: int
+
+
+_WHITESPACE = re.compile(r"[ \n\r\t]*")
+_NUMBER = re.compile(r"(-?)(0|[1-9][0-9]*)?(?:\.([0-9]*))?(?:[eE]([-+]?)([0-9]*))?")
+# Raw characters outside of 0x20..0x10FFF are dropped from strings.
+_STRING_CHUNK = re.compile(r'[^"\\\x00-\x1f\U00011000-\U0010ffff]*')
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+_LITERALS = (("true", True), ("false", False), ("null", None))
+_PUNCTUATION = "{}[]:,"
+
+# byte-level versions, for reading from files and buffers
+_WHITESPACE_BYTES = re.compile(_WHITESPACE.pattern.encode())
+_NUMBER_BYTES = re.compile(_NUMBER.pattern.encode())
+_STRING_BYTES = re.compile(rb'"[^"\\]*(?:\\[\s\S][^"\\]*)*"')
+# a string's contents up to its closing quote, or to the end of the data read so far
+_STRING_BODY_BYTES = re.compile(rb'[^"\\]*(?:\\[\s\S][^"\\]*)*')
+_LITERALS_BYTES = tuple((word.encode(), literal) for word, literal in _LITERALS)
+_PUNCTUATION_BYTES = _PUNCTUATION.encode()
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+Buffer = typing.Union[bytes, bytearray, memoryview, mmap]
+
+
+def _context(source: str, position: int) -> str:
+    return source[position : position + 16]
+
+
+def _json_number(
+    source: str, position: int
+) -> typing.Tuple[typing.Union[float, int], int]:
+    match = _NUMBER.match(source, position)
+    # the regex can always match an empty string, so this is never None
+    assert match is not None
+    sign, digits, fraction_digits, exponent_sign, exponent_digits = match.groups()
+    if digits is None:
+        raise ValueError(
+            f"numbers must start with 0-9 at position {position} ({_context(source, position)})"
+        )
+    base_part = int(digits)
+    fractional_part = 0.0
+    inverted_exponent = -1
+    for digit in fraction_digits or "":
+        fractional_part += float(digit) * (10.0**inverted_exponent)
+        inverted_exponent -= 1
+    exponential_part = int(exponent_digits) if exponent_digits else 0
+    if exponent_sign == "-":
+        exponential_part *= -1
+
+    # put it all together
+    result = (base_part + fractional_part) * (10**exponential_part)
+    if sign:
+        result *= -1
+    if int(result) == result:
+        return int(result), match.end()
+    return result, match.end()
 
 
-def _take(stream: StringStream, needed_chars: str, error: bool = True) -> bool:
-    start_pos = stream.tell()
-    read = stream.read(len(needed_chars), error)
-    if read != needed_chars:
-        if error:
+def _json_string(source: str, position: int) -> typing.Tuple[str, int]:
+    # position is just past the opening quote
+    parts: typing.List[str] = []
+    while True:
+        chunk = _STRING_CHUNK.match(source, position)
+        assert chunk is not None
+        parts.append(chunk.group(0))
+        position = chunk.end()
+        if position >= len(source):
             raise ValueError(
-                f"expecting '{needed_chars}', got '{read}' at position {start_pos}\n "
-                f"stream={stream.source[start_pos:start_pos+32]}"
+                f"unterminated string (reached end at position {position})"
             )
+        next_c = source[position]
+        position += 1
+        if next_c == '"':
+            return "".join(parts), position
+        if next_c != "\\":
+            # out-of-range character; skip it
+            continue
+        # control characters
+        control_char = source[position : position + 1]
+        position += 1
+        if control_char in _ESCAPES:
+            parts.append(_ESCAPES[control_char])
+        elif control_char == "u":
+            hex_digits = source[position : position + 4]
+            if not _HEX4.match(hex_digits):
+                raise ValueError(
+                    f"expecting four hex digits for \\u, got {hex_digits} instead"
+                )
+            parts.append(chr(int(hex_digits, 16)))
+            position += 4
+        else:
+            raise ValueError(f"unrecognized escape {control_char}")
+
+
+def tokenize(source: str, position: int = 0) -> typing.Iterator[Token]:
+    """
+    Split a JSON document into tokens, without ever copying the unread part of the source.
+    Tokens are produced lazily, so anything after the root value is never looked at.
+    """
+    length = len(source)
+    while True:
+        position = _WHITESPACE.match(source, position).end()  # type: ignore
+        if position >= length:
+            return
+        start = position
+        next_c = source[position]
+        if next_c in _PUNCTUATION:
+            position += 1
+            yield Token(next_c, None, start)
+        elif next_c == '"':
+            value, position = _json_string(source, position + 1)
+            yield Token("value", value, start)
+        elif next_c in "-0123456789":
+            number, position = _json_number(source, position)
+            yield Token("value", number, start)
         else:
-            # rewind the stream
-            stream.seek(start_pos)
+            for word, literal in _LITERALS:
+                if source.startswith(word, position):
+                    position += len(word)
+                    yield Token("value", literal, start)
+                    break
+            else:
+                raise ValueError(
+                    f"expecting JSON value at position {start} ({_context(source, start)})"
+                )
+
+
+def tokenize_bytes(
+    source: typing.Union[typing.BinaryIO, Buffer],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> typing.Iterator[Token]:
+    """
+    Split UTF-8 encoded JSON into tokens.
+    source can be a binary file object, which is read chunk_size bytes at a time, or a buffer
+    (bytes, mmap, ...), which is scanned in place. Token offsets are absolute byte offsets.
+    Only the current token and the unread rest of the chunk are ever kept in memory.
+    """
+    fp: typing.Optional[typing.BinaryIO] = None
+    window: Buffer
+    if isinstance(source, (bytes, bytearray, memoryview, mmap)):
+        window = source
+    else:
+        fp = source
+        window = b""
+    base = 0  # absolute offset of window[0]
+    position = 0  # start of the current token in window
+
+    def more() -> bool:
+        """
+        Read another chunk, dropping everything before the current token.
+        :return: False if there is nothing left to read.
+        """
+        nonlocal window, base, position, fp
+        if fp is None:
+            return False
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            fp = None
             return False
-    return True
+        window = bytes(window[position:]) + chunk
+        base += position
+        position = 0
+        return True
 
+    def long_string() -> bytes:
+        """
+        Read a string that runs past the end of the window, starting at its opening quote.
+        Chunks are appended as they come and only the new part is scanned each time, so
+        long strings cost linear time. Leaves the window just past the closing quote.
+        :return: The string's bytes, quotes included.
+        """
+        nonlocal window, base, position, fp
+        pending = bytearray(window[position:])
+        base += position
+        scanned = 1  # just past the opening quote
+        while True:
+            end = _STRING_BODY_BYTES.match(pending, scanned).end()  # type: ignore
+            if end < len(pending) and pending[end] == ord('"'):
+                window = bytes(pending[end + 1 :])
+                base += end + 1
+                position = 0
+                del pending[end + 1 :]
+                return bytes(pending)
+            # either out of data, or stopped at a backslash whose escape isn't read yet
+            scanned = end
+            chunk = fp.read(chunk_size) if fp is not None else b""
+            if not chunk:
+                fp = None
+                # unterminated; let the string parser report it
+                _json_string(bytes(pending).decode("utf-8"), 1)
+                raise ValueError(f"unterminated string at position {base}")
+            pending += chunk
 
-def _check(stream: StringStream, checked_chars: str) -> bool:
-    start_pos = stream.tell()
-    read = stream.read(len(checked_chars))
-    stream.seek(start_pos)  # rewind the stream
-    return read == checked_chars
+    while True:
+        position = _WHITESPACE_BYTES.match(window, position).end()  # type: ignore
+        if position >= len(window):
+            if more():
+                continue
+            return
+        start = base + position
+        next_b = window[position : position + 1]
+        if next_b in _PUNCTUATION_BYTES:
+            position += 1
+            yield Token(next_b.decode(), None, start)
+        elif next_b == b'"':
+            match = _STRING_BYTES.match(window, position)
+            if match is not None:
+                text = bytes(window[position : match.end()]).decode("utf-8")
+                position = match.end()
+            else:
+                text = long_string().decode("utf-8")
+            yield Token("value", _json_string(text, 1)[0], start)
+        elif next_b in b"-0123456789":
+            match = _NUMBER_BYTES.match(window, position)
+            assert match is not None
+            if match.end() >= len(window) and more():
+                continue
+            text = bytes(window[position : match.end()]).decode("ascii")
+            position = match.end()
+            yield Token("value", _json_number(text, 0)[0], start)
+        else:
+            if len(window) - position < 5 and more():
+                continue
+            for word, literal in _LITERALS_BYTES:
+                if window[position : position + len(word)] == word:
+                    position += len(word)
+                    yield Token("value", literal, start)
+                    break
+            else:
+                raise ValueError(
+                    f"expecting JSON value at position {start} ({bytes(window[position : position + 16])!r})"
+                )
 
 
-def _whitespace(stream: StringStream):
-    if stream.eof():
-        return
-    regex = r"[ \n\r\t]*"
-    number = re.match(regex, stream.peek())
-    if number is None:
-        raise ValueError(
-            "whitespace failed to match, even though it can match an empty string?? (this is not good)"
-        )
-    stream.read(len(number.group(0)))
+def _next(tokens: typing.Iterator[Token]) -> Token:
+    try:
+        return next(tokens)
+    except StopIteration:
+        raise ValueError("unexpected end of JSON input") from None
 
 
-def loads(json_string: str) -> typing.Tuple[JSON, FilePosStorage]:
-    # WIP
-    handle = StringStream(json_string)  # type:ignore
-    store = FilePosStorage()
-    return _json_value(handle, store), store
+class _DuplicateKey(Exception):
+    """
+    A key appeared twice in an object. Containers aren't linked into the storage until
+    they're done, so each one the error passes through adds its key to the path.
+    """
 
+    def __init__(self, path: MutableJsonPath, position: int):
+        super().__init__(path, position)
+        self.path = path
+        self.position = position
 
-def _json_value(
-    stream: StringStream,
-    path_storage: FilePosStorage,
-    path_to_this: typing.Optional[MutableJsonPath] = None,
-) -> JSON:
-    if path_to_this is None:
-        path_to_this = []
-    path_storage.put(path_to_this, stream.tell())
-    _whitespace(stream)
-    res: JSON
-    # Simple stuff
-    if _take(stream, "true", False):
-        res = True
-    elif _take(stream, "false", False):
-        res = False
-    elif _take(stream, "null", False):
-        res = None
-    elif _check(stream, '"'):
-        res = _json_string(stream)
-    # Complicated stuff
-    elif _check(stream, "{"):
-        res = _json_object(stream, path_storage, path_to_this)
-    elif _check(stream, "["):
-        res = _json_array(stream, path_storage, path_to_this)
-    else:
-        # is it a NUMBER?
-        next_char = stream.peek()[0]  # next char, no advance
-        if next_char in "-0123456789":
-            # yes, it is
-            res = _json_number(stream)
-        else:
-            # no clue lol
-            raise ValueError(
-                f"expecting JSON value at position {stream.tell()} ({stream.peek()[:16]})"
-            )
-    _whitespace(stream)
-    return res
 
+def _build(tokens: typing.Iterator[Token]) -> typing.Tuple[JSON, FilePosStorage]:
+    store = FilePosStorage()
+    store.put([], 0)
+    try:
+        return _json_value(_next(tokens), tokens, store, store.ROOT), store
+    except _DuplicateKey as e:
+        raise KeyError(
+            f"Path already assigned a file position: {e.path}; it is at {e.position}"
+        ) from None
 
-def _json_number(stream: StringStream) -> typing.Union[float, int]:
-    # it can have a negative sign
-    is_negative = _take(stream, "-", False)
 
-    # Main digit part
-    def read_digits() -> int:
-        digits = 0
-        if _take(stream, "0", False):
-            return digits
-        next_c = stream.read(1)
-        if next_c not in "123456789":
-            raise ValueError(
-                f"numbers other than 0 must start with 1-9, not '{next_c}'\n{stream.peek()[:32]}"
-            )
-        digits += int(next_c)
-        while True:
-            next_c = stream.read(1, False)
-            if next_c == "":
-                # end of stream
-                break
-            if next_c not in "0123456789":
-                stream.rewind(1)
-                break
-            digits *= 10
-            digits += int(next_c)
-        return digits
-
-    base_part = read_digits()
-
-    def read_fraction() -> float:
-        if stream.eof():
-            return 0.0
-        if not _take(stream, ".", False):
-            return 0.0
-        fraction = 0.0
-        inverted_exponent = -1
-        # read digits
-        while True:
-            next_c = stream.read(1, False)
-            if next_c == "":
-                # end of stream
-                break
-            if next_c not in "0123456789":
-                stream.rewind(1)
-                break
-            fraction += float(next_c) * (10.0**inverted_exponent)
-            inverted_exponent -= 1
-        return fraction
-
-    fractional_part = read_fraction()
-
-    def read_exponent() -> int:
-        if stream.eof():
-            return 0
-        if not (_take(stream, "e", False) or _take(stream, "E", False)):
-            return 0
-        exponent = 0
-        exponent_negative = _take(stream, "-", False)
-        if not exponent_negative:
-            _take(stream, "+", False)  # optionally have a plus sign
-        # read digits
-        while True:
-            next_c = stream.read(1, False)
-            if next_c == "":
-                # end of stream
-                break
-            if next_c not in "0123456789":
-                stream.rewind(1)
-                break
-            exponent *= 10
-            exponent += int(next_c)
-        if exponent_negative:
-            exponent *= -1
-        return exponent
-
-    exponential_part = read_exponent()
+def loads(json_string: str) -> typing.Tuple[JSON, FilePosStorage]:
+    return _build(tokenize(json_string))
 
-    # put it all together
-    result = (base_part + fractional_part) * (10**exponential_part)
-    if is_negative:
-        result *= -1
-    if int(result) == result:
-        return int(result)
-    return result
 
+def load(
+    source: typing.Union[typing.BinaryIO, Buffer],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> typing.Tuple[JSON, FilePosStorage]:
+    """
+    Parse UTF-8 JSON from a binary file object or a buffer such as an mmap, a chunk at a time.
+    Positions in the returned storage are byte offsets, not character offsets.
+    """
+    result, store = _build(tokenize_bytes(source, chunk_size))
+    store.byte_offsets = True
+    return result, store
 
-def _json_string(stream: StringStream) -> str:
-    _take(stream, '"')
-    b = ""
-    while True:
-        next_c = stream.read(1)
-        if next_c == "\\":
-            # control characters
-            control_char = stream.read(1)
-            if control_char == '"':
-                b += '"'
-            elif control_char == "\\":
-                b += "\\"
-            elif control_char == "/":
-                b += "/"
-            elif control_char == "b":
-                b += "\b"
-            elif control_char == "f":
-                b += "\f"
-            elif control_char == "n":
-                b += "\n"
-            elif control_char == "r":
-                b += "\r"
-            elif control_char == "t":
-                b += "\t"
-            elif control_char == "u":
-                hex_digits = stream.read(4)
-                if not re.match(r"[0-9a-fA-F]{4}", hex_digits):
-                    raise ValueError(
-                        f"expecting four hex digits for \\u, got {hex_digits} instead"
-                    )
-                b += chr(int(hex_digits, 16))
-            else:
-                raise ValueError(f"unrecognized escape {control_char}")
-            continue
-        if 0x20 <= ord(next_c) <= 0x10FFF:
-            if next_c == '"':
-                return b
-            b += next_c
+
+def _json_value(
+    token: Token,
+    tokens: typing.Iterator[Token],
+    path_storage: FilePosStorage,
+    node: int,
+) -> JSON:
+    if token.kind == "value":
+        return token.value
+    if token.kind == "{":
+        return _json_object(tokens, path_storage, node)
+    if token.kind == "[":
+        return _json_array(tokens, path_storage, node)
+    raise ValueError(
+        f"expecting JSON value at position {token.start}, got '{token.kind}'"
+    )
 
 
 def _json_object(
-    stream: StringStream, path_storage: FilePosStorage, path_to_this: MutableJsonPath
-) -> JSONObject:  # todo: migrate types
-    _take(stream, "{")
-    _whitespace(stream)
-    if _take(stream, "}", False):
-        return {}
+    tokens: typing.Iterator[Token],
+    path_storage: FilePosStorage,
+    node: int,
+) -> JSONObject:
     result: JSONObject = {}
+    token = _next(tokens)
+    if token.kind == "}":
+        return result
+    members: typing.List[int] = []
+    # position of each key's value, in order
+    keys: typing.Dict[str, int] = {}
     while True:
-        key = _json_string(stream)
-        _whitespace(stream)
-        _take(stream, ":")
-        _whitespace(stream)
-        value = _json_value(
-            stream, path_storage=path_storage, path_to_this=path_to_this + [key]
-        )
-        _whitespace(stream)
+        if token.kind != "value" or not isinstance(token.value, str):
+            raise ValueError(f"expecting object key at position {token.start}")
+        key = sys.intern(token.value)
+        token = _next(tokens)
+        if token.kind != ":":
+            raise ValueError(
+                f"expecting ':' at position {token.start}, got '{token.kind}'"
+            )
+        token = _next(tokens)
+        if key in keys:
+            raise _DuplicateKey([key], keys[key])
+        keys[key] = token.start
+        members.append(path_storage.add_node(node, token.start))
+        try:
+            result[key] = _json_value(token, tokens, path_storage, members[-1])
+        except _DuplicateKey as e:
+            e.path.insert(0, key)
+            raise
         # , or }
-        result[key] = value
-        if _take(stream, "}", False):
-            break
-        _take(stream, ",")
-        _whitespace(stream)
-    return result
+        token = _next(tokens)
+        if token.kind == "}":
+            path_storage.set_elements(node, members, keys)
+            return result
+        if token.kind != ",":
+            raise ValueError(
+                f"expecting ',' at position {token.start}, got '{token.kind}'"
+            )
+        token = _next(tokens)
 
 
 def _json_array(
-    stream: StringStream, path_storage: FilePosStorage, path_to_this: MutableJsonPath
+    tokens: typing.Iterator[Token],
+    path_storage: FilePosStorage,
+    node: int,
 ) -> JSONArray:
-    _take(stream, "[")
-    _whitespace(stream)
-    if _take(stream, "]", False):
-        return []
     result: JSONArray = []
-    index = 0
+    token = _next(tokens)
+    if token.kind == "]":
+        return result
+    elements: typing.List[int] = []
     while True:
-        _whitespace(stream)
-        value = _json_value(
-            stream, path_storage=path_storage, path_to_this=path_to_this + [index]
-        )
-        result.append(value)
-        _whitespace(stream)
-        index += 1
-        if _take(stream, "]", False):
-            break
-        _take(stream, ",")
-        _whitespace(stream)
+        child = path_storage.add_node(node, token.start)
+        elements.append(child)
+        try:
+            result.append(_json_value(token, tokens, path_storage, child))
+        except _DuplicateKey as e:
+            e.path.insert(0, len(elements) - 1)
+            raise
+        # , or ]
+        token = _next(tokens)
+        if token.kind == "]":
+            path_storage.set_elements(node, elements)
+            return result
+        if token.kind != ",":
+            raise ValueError(
+                f"expecting ',' at position {token.start}, got '{token.kind}'"
+            )
+        token = _next(tokens)
+
+
+class DeferredFilePosStorage(FilePosStorage):
+    """
+    FilePosStorage that doesn't know any positions up front.
+    Positions are found by re-scanning the source the first time a path is asked for,
+    so documents that never produce an error never pay for a position map.
+    """
+
+    def __init__(self, source: str):
+        super().__init__()
+        self.source = source
+
+    def get(self, path_to: JsonPath) -> int:
+        try:
+            return super().get(path_to)
+        except KeyError:
+            position = _locate(self.source, tuple(path_to))
+            self.put(path_to, position, True)
+            return position
+
+
+def _skip(token: Token, tokens: typing.Iterator[Token]):
+    """
+    Consume the rest of the value that starts with token.
+    """
+    depth = 0
+    while True:
+        if token.kind in "{[":
+            depth += 1
+        elif token.kind in "}]":
+            depth -= 1
+        if depth <= 0:
+            return
+        token = _next(tokens)
+
+
+def _locate(source: str, path_to: FrozenJsonPath) -> int:
+    position = 0
+    for key in path_to:
+        tokens = tokenize(source, position)
+        token = _next(tokens)
+        found: typing.Optional[int] = None
+        if token.kind == "{" and isinstance(key, str):
+            token = _next(tokens)
+            while token.kind != "}":
+                member = token.value
+                _next(tokens)  # :
+                token = _next(tokens)
+                if member == key:
+                    # duplicate keys: the last one wins, like json.loads
+                    found = token.start
+                _skip(token, tokens)
+                token = _next(tokens)
+                if token.kind == ",":
+                    token = _next(tokens)
+        elif token.kind == "[" and isinstance(key, int):
+            token = _next(tokens)
+            index = 0
+            while token.kind != "]":
+                if index == key:
+                    found = token.start
+                    break
+                _skip(token, tokens)
+                token = _next(tokens)
+                if token.kind == ",":
+                    token = _next(tokens)
+                index += 1
+        if found is None:
+            raise KeyError(f"Path not found: {list(path_to)}")
+        position = found
+    return position
+
+
+def _parse_number(number: str) -> typing.Union[float, int]:
+    # convert exactly like the reader does, rounding and overflow included
+    return _json_number(number, 0)[0]
+
+
+# Things the json module decodes differently from the reader: characters the reader drops
+# from strings, and escaped surrogate pairs, which the reader keeps as two characters.
+_JSON_MODULE_DIFFERS = re.compile(r"[\U00011000-\U0010ffff]|\\u[dD][89abAB]")
+
+
+class _UseReader(Exception):
+    pass
+
+
+def _reject_duplicates(pairs: typing.List[typing.Tuple[str, JSON]]) -> JSONObject:
+    result: JSONObject = dict(pairs)
+    if len(result) != len(pairs):
+        raise _UseReader()
     return result
 
 
+def _reject_constant(constant: str) -> typing.NoReturn:
+    raise _UseReader()
+
+
+def loads_deferred(json_string: str) -> typing.Tuple[JSON, DeferredFilePosStorage]:
+    """
+    Decode with the json module and only work out file positions if something asks for them.
+    Anything the json module would decode differently, or rejects, is decoded by the reader
+    instead, so the result (or error) is always the same as loads().
+    """
+    if _JSON_MODULE_DIFFERS.search(json_string) is None:
+        try:
+            result: JSON = json.loads(
+                json_string,
+                object_pairs_hook=_reject_duplicates,
+                parse_float=_parse_number,
+                parse_int=_parse_number,
+                parse_constant=_reject_constant,
+            )
+            return result, DeferredFilePosStorage(json_string)
+        except (_UseReader, json.JSONDecodeError):
+            # duplicate keys, trailing data, raw control characters, numbers like "1."...
+            pass
+    result, _ = loads(json_string)
+    return result, DeferredFilePosStorage(json_string)
+
+
 if __name__ == "__main__":
     with open("/workspaces/pixelscribe/pixelscribe/theme-schema.json") as f:
         s = f.read()
@@ -2,16 +2,57 @@ import math
 import os.path
 import re
 import typing
+import weakref
 
 from PIL import Image
 
-from pixelscribe import AssetResource, Feature, parser
-from pixelscribe.contexts import FinalizeJsonErrors, JsonContext, JsonFileContext
-from pixelscribe.exceptions import ValidationError
+from pixelscribe import AssetResource, Feature, asset_resource, parser
+from pixelscribe.asset_cache import image_bytes
+from pixelscribe.contexts import (
+    CollectJsonErrors,
+    FinalizeJsonErrors,
+    JsonContext,
+    JsonFileContext,
+)
+from pixelscribe.exceptions import (
+    JSONTraceable,
+    SourceMap,
+    ValidationError,
+    ValidationErrorGroup,
+)
 from pixelscribe.feature_1d import Feature1D
 from pixelscribe.feature_2d import Feature2D
+from pixelscribe.load_stats import AssetStats, CollectAssetStats
 from pixelscribe.overlay import Anchor2D, Overlay
+from pixelscribe.parser.json_types import JSON
 from pixelscribe.parser.reader import FilePosStorage
+from pixelscribe.tile_cache import TileCache
+
+
+def _asset_sources(config: JSON, theme_dir: typing.Optional[str]) -> typing.Set[str]:
+    """
+    Resolved paths of every "source" in a theme config: features, their overrides and overlays.
+    Anything malformed is skipped here and reported by validation instead.
+    """
+    bodies: typing.List[JSON] = []
+    if isinstance(config, dict):
+        for section in ("features", "overlays"):
+            items = config.get(section)
+            if isinstance(items, list):
+                bodies.extend(items)
+        features = config.get("features")
+        if isinstance(features, list):
+            for feature in features:
+                if isinstance(feature, dict) and isinstance(
+                    feature.get("overrides"), list
+                ):
+                    bodies.extend(typing.cast(typing.List[JSON], feature["overrides"]))
+    sources: typing.Set[str] = set()
+    for body in bodies:
+        if isinstance(body, dict) and isinstance(body.get("source"), str):
+            source = typing.cast(str, body["source"])
+            sources.add(asset_resource.resolve_source(source, theme_dir))
+    return sources
 
 
 class Clearance:
@@ -49,6 +90,9 @@ class Theme:
         self.features: typing.List[Feature] = []
         self.overlays: typing.List[Overlay] = []
         self.colors: typing.Dict[str, typing.Tuple[int, int, int]] = {}
+        self._asset_stats = AssetStats()
+        # tiled backgrounds and edges by size, reused by later draws
+        self.tile_cache = TileCache()
 
     FT = typing.TypeVar("FT", bound=Feature)
 
@@ -69,6 +113,55 @@ class Theme:
             )
         raise ValueError(f"Feature {feature_type} not found.")
 
+    def assets(self) -> typing.Iterator[AssetResource]:
+        """
+        Every asset used by this theme's own features and overlays (not inherited ones).
+        """
+        for feature in self.features:
+            yield from feature.assets()
+        for overlay in self.overlays:
+            yield from overlay.assets()
+
+    def pin_assets(self):
+        """
+        Keep this theme's images in the shared asset cache for as long as the theme is alive.
+        """
+        paths = {asset.source_path for asset in self.assets() if not asset.is_static}
+        asset_resource.shared_asset_cache.pin_all(paths)
+        weakref.finalize(self, asset_resource.shared_asset_cache.unpin_all, paths)
+
+    def asset_stats(self) -> AssetStats:
+        """
+        Asset loading counters for this theme's imports and draws, with resident_bytes set
+        to the decoded images its assets hold right now, including expanded palette crops.
+        """
+        images: typing.Dict[int, Image.Image] = {}
+        for asset in self.assets():
+            if asset.is_loaded:
+                images[id(asset.source)] = asset.source
+                expanded = asset.expanded
+                if expanded is not None:
+                    images[id(expanded)] = expanded
+        resident = sum(image_bytes(image) for image in images.values())
+        return self._asset_stats.snapshot(resident)
+
+    def reset_asset_stats(self):
+        self._asset_stats.reset()
+
+    def refresh(self) -> typing.List[str]:
+        """
+        Reload the assets whose files changed since they were read, leaving the rest alone.
+        Changed assets aren't validated again, so if one changes size, import the theme again.
+        :return: Paths of the reloaded files.
+        """
+        changed: typing.Dict[str, None] = {}
+        for asset in self.assets():
+            if asset.refresh():
+                changed[asset.source_path] = None
+        if changed:
+            self.tile_cache.clear()
+        return list(changed)
+
     def layer1(self) -> typing.List[Overlay]:
         def filter_(overlay: Overlay) -> bool:
             return (
@@ -150,6 +243,12 @@ class Theme:
 
     def draw(
         self, width: int, height: int, text_layer: typing.Optional[Image.Image] = None
+    ):
+        with CollectAssetStats(self._asset_stats):
+            self._draw(width, height, text_layer)
+
+    def _draw(
+        self, width: int, height: int, text_layer: typing.Optional[Image.Image] = None
     ):
         # they need to have the same aspect ratio
         if text_layer is None:
@@ -171,8 +270,8 @@ class Theme:
         # create the bottom layer
         # background and borders
         layer_size = [width, height]
-        background = self.get_feature_by_type("background", Feature2D).tile(
-            width, height
+        background = self.tile_cache.tile_2d(
+            self.get_feature_by_type("background", Feature2D), width, height
         )
 
         clearance = self._get_edge_clearance()
@@ -204,13 +303,21 @@ class Theme:
         layer0.alpha_composite(brc, (clearance.left + width, clearance.top + height))
 
         # paste edges
-        top = self.get_feature_by_type("top_edge", Feature1D).tile(width)
+        top = self.tile_cache.tile_1d(
+            self.get_feature_by_type("top_edge", Feature1D), width
+        )
         layer0.alpha_composite(top, (clearance.left, clearance.top - top.height))
-        bottom = self.get_feature_by_type("bottom_edge", Feature1D).tile(width)
+        bottom = self.tile_cache.tile_1d(
+            self.get_feature_by_type("bottom_edge", Feature1D), width
+        )
         layer0.alpha_composite(bottom, (clearance.left, clearance.top + height))
-        left = self.get_feature_by_type("left_edge", Feature1D).tile(height)
+        left = self.tile_cache.tile_1d(
+            self.get_feature_by_type("left_edge", Feature1D), height
+        )
         layer0.alpha_composite(left, (clearance.left - left.width, clearance.top))
-        right = self.get_feature_by_type("right_edge", Feature1D).tile(height)
+        right = self.tile_cache.tile_1d(
+            self.get_feature_by_type("right_edge", Feature1D), height
+        )
         layer0.alpha_composite(right, (clearance.left + width, clearance.top))
 
         # On to layer 1!
@@ -334,15 +441,56 @@ class Theme:
             final.save(path)
 
     @classmethod
-    def import_(cls, config_path: str):
-        with open(config_path, "r") as f:
-            config, file_map = parser.loads(f.read())
+    def import_(
+        cls,
+        config_path: str,
+        defer_positions: bool = False,
+        stream: bool = False,
+        collect_errors: bool = False,
+        prefetch_workers: int = 0,
+    ):
+        """
+        Import a theme from a JSON file.
+        :param config_path: Path to the theme file.
+        :param defer_positions: Decode with the json module and only look up file positions
+                                when an error needs them. Faster for themes that are valid.
+        :param stream: Parse the file in chunks instead of reading it into a string first.
+        :param collect_errors: Keep validating after an error in a feature, overlay or color,
+                               and raise a ValidationErrorGroup with all of them at the end.
+        :param prefetch_workers: Decode every asset on this many threads before validating,
+                                 instead of one at a time on first use. 0 to turn it off.
+        :return: The imported theme.
+        """
+        if defer_positions and stream:
+            raise ValueError("defer_positions and stream can't be used together")
+        file_map: FilePosStorage
+        if stream:
+            with open(config_path, "rb") as f:
+                config, file_map = parser.load(f)
+            # only read back if there's an error to show
+            source_map = SourceMap(path=config_path)
+        else:
+            with open(config_path, "r") as f:
+                source = f.read()
+            if defer_positions:
+                config, file_map = parser.loads_deferred(source)
+            else:
+                config, file_map = parser.loads(source)
+            source_map = SourceMap(source)
         theme_dir = os.path.dirname(config_path)  # effectively os.split(config_path)[0]
-        with FinalizeJsonErrors(file_map), JsonFileContext(config_path):
+        stats = AssetStats()
+        with CollectAssetStats(stats), FinalizeJsonErrors(
+            file_map, source_map
+        ), JsonFileContext(config_path):
+            if prefetch_workers > 0:
+                asset_resource.prefetch(
+                    _asset_sources(config, theme_dir), prefetch_workers
+                )
             # TODO: inherit from other themes
             theme = cls(
                 DEFAULT, config_path, theme_dir, file_map
             )  # set up the container
+            theme._asset_stats = stats
 
             # initial validation setup
             if not isinstance(config, dict):
@@ -352,21 +500,26 @@ class Theme:
                     "",
                 )
 
+            # when collecting, errors are kept here instead of stopping the import
+            errors: typing.Optional[typing.List[JSONTraceable]] = (
+                [] if collect_errors else None
+            )
+
             # load up the features
-            if "features" not in config:
-                features = []
-            else:
-                if isinstance(config["features"], list):
-                    features = config["features"]
-                else:
-                    raise ValidationError(
-                        "Features must be a list, not a "
-                        + type(config["features"]).__name__,
-                        ValidationError.ErrorCode.WRONG_TYPE,
-                        "features",
-                    )
+            features: typing.List[JSON] = []
+            if "features" in config:
+                with CollectJsonErrors(errors):
+                    if isinstance(config["features"], list):
+                        features = config["features"]
+                    else:
+                        raise ValidationError(
+                            "Features must be a list, not a "
+                            + type(config["features"]).__name__,
+                            ValidationError.ErrorCode.WRONG_TYPE,
+                            "features",
+                        )
             for i, feature in enumerate(features):
-                with JsonContext("features", i):
+                with CollectJsonErrors(errors), JsonContext("features", i):
                     # try to load up the feature type first...
                     feature_type = Feature.get_feature_type(feature)
                     # pick the correct type
@@ -386,62 +539,62 @@ class Theme:
                         )
 
             # load up the overlays
-            if "overlays" not in config:
-                overlays = []
-            else:
-                if isinstance(config["overlays"], list):
-                    overlays = config["overlays"]
-                else:
-                    raise ValidationError(
-                        "Overlays must be a list, not a "
-                        + type(config["overlays"]).__name__,
-                        ValidationError.ErrorCode.WRONG_TYPE,
-                        "overlays",
-                    )
+            overlays: typing.List[JSON] = []
+            if "overlays" in config:
+                with CollectJsonErrors(errors):
+                    if isinstance(config["overlays"], list):
+                        overlays = config["overlays"]
+                    else:
+                        raise ValidationError(
+                            "Overlays must be a list, not a "
+                            + type(config["overlays"]).__name__,
+                            ValidationError.ErrorCode.WRONG_TYPE,
+                            "overlays",
+                        )
             for i, overlay in enumerate(overlays):
-                with JsonContext("overlays", i):
+                with CollectJsonErrors(errors), JsonContext("overlays", i):
                     theme.overlays.append(Overlay.import_(overlay, theme_dir))
 
             # load up the colors(?)
-            if "colors" not in config:
-                colors = {}
-            else:
-                if isinstance(config["colors"], dict):
-                    colors = config["colors"]
-                else:
-                    raise ValidationError(
-                        "Colors must be a dict, not a "
-                        + type(config["colors"]).__name__,
-                        ValidationError.ErrorCode.WRONG_TYPE,
-                        "colors",
-                    )
+            colors: typing.Dict[str, JSON] = {}
+            if "colors" in config:
+                with CollectJsonErrors(errors):
+                    if isinstance(config["colors"], dict):
+                        colors = config["colors"]
+                    else:
+                        raise ValidationError(
+                            "Colors must be a dict, not a "
+                            + type(config["colors"]).__name__,
+                            ValidationError.ErrorCode.WRONG_TYPE,
+                            "colors",
+                        )
             for color_name, color in colors.items():
-                with JsonContext("colors", color_name):
+                with CollectJsonErrors(errors), JsonContext("colors", color_name):
                     if not isinstance(color, str):
                         raise ValidationError(
                             "Color values must be strings, not a "
                             + type(color).__name__,
                             ValidationError.ErrorCode.WRONG_TYPE,
-                            color_name,
+                            "",  # handled by context manager
                         )
                     if color[0] != "#":
                         raise ValidationError(
                             "Color values must be hex strings (start it with a #)",
                             ValidationError.ErrorCode.INVALID_VALUE,
-                            color_name,
+                            "",  # handled by context manager
                         )
                     if len(color) != 7:
                         raise ValidationError(
                             f"Color values must have 6 hexadecimal characters, not {len(color) - 1}",
                             ValidationError.ErrorCode.INVALID_VALUE,
-                            color_name,
+                            "",  # handled by context manager
                         )
                     for char in color[1:]:
                         if char not in "0123456789abcdefABCDEF":
                             raise ValidationError(
                                 f"Color values must be hex strings, not {char}",
                                 ValidationError.ErrorCode.INVALID_VALUE,
-                                color_name,
+                                "",  # handled by context manager
                             )
                     color_data = (
                         int(color[1:3], 16),
@@ -449,6 +602,9 @@ class Theme:
                         int(color[5:7], 16),
                     )
                     theme.colors[color_name] = color_data
+            if errors:
+                raise ValidationErrorGroup(errors)
+            theme.pin_assets()
             return theme  # all done!
 
 
@@ -0,0 +1,149 @@
+"""
+On-disk cache of imported themes.
+
+A cached theme is a pickle of the validated Theme (features, overrides, overlays, colors,
+file map and decoded asset pixels), stored under a hash of the theme file's path and
+contents. Entries also record a hash of every asset file, and are only used if all of them
+still match.
+
+Cache entries are pickles, so only point this at a directory you trust.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import tempfile
+import typing
+
+from pixelscribe import __version__, asset_resource
+from pixelscribe.theme import DEFAULT, Theme
+
+# bump when the pickled layout of Theme and friends changes
+CACHE_FORMAT = 7
+
+_DEFAULT_ID = "pixelscribe.theme.DEFAULT"
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry_path(config_path: str, cache_dir: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(config_path).encode())
+    digest.update(b"\0")
+    with open(config_path, "rb") as f:
+        digest.update(f.read())
+    return os.path.join(cache_dir, digest.hexdigest() + ".pickle")
+
+
+def _asset_hashes(theme: Theme) -> typing.Dict[str, str]:
+    return {
+        asset.source_path: _hash_file(asset.source_path)
+        for asset in theme.assets()
+        if not asset.is_static
+    }
+
+
+class _Pickler(pickle.Pickler):
+    # the default theme is rebuilt on import, so store a reference to it instead of a copy
+    def persistent_id(self, obj: typing.Any) -> typing.Optional[str]:
+        if obj is DEFAULT:
+            return _DEFAULT_ID
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid: typing.Any) -> typing.Any:
+        if pid == _DEFAULT_ID:
+            return DEFAULT
+        raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+
+
+def load(config_path: str, cache_dir: str) -> typing.Optional[Theme]:
+    """
+    Get a previously stored theme for config_path.
+    :return: The theme, or None if there is no up-to-date entry.
+    """
+    return _load(_entry_path(config_path, cache_dir))
+
+
+def _load(entry_path: str) -> typing.Optional[Theme]:
+    if not os.path.exists(entry_path):
+        return None
+    try:
+        with open(entry_path, "rb") as f:
+            entry = _Unpickler(f).load()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if entry.get("format") != CACHE_FORMAT or entry.get("version") != __version__:
+        return None
+    for path, digest in entry["assets"].items():
+        if not os.path.exists(path) or _hash_file(path) != digest:
+            return None
+    theme: Theme = entry["theme"]
+    # counts from the process that stored it don't mean anything here
+    theme.reset_asset_stats()
+    # share decoded images with anything else that uses the same files
+    for asset in theme.assets():
+        if not asset.is_static and asset.is_loaded:
+            identity = (
+                None if asset.identity is None else (asset.source_path, asset.identity)
+            )
+            asset.source = asset_resource.shared_asset_cache.setdefault(
+                asset.source_path,
+                asset_resource.shared_image_pool.intern(asset.source, identity),
+                asset.identity,
+            )
+    theme.pin_assets()
+    return theme
+
+
+def store(theme: Theme, cache_dir: str):
+    """
+    Save an imported theme so load() can return it without parsing or validating again.
+    """
+    _store(theme, cache_dir, _entry_path(theme.config_path, cache_dir))
+
+
+def _store(theme: Theme, cache_dir: str, entry_path: str):
+    os.makedirs(cache_dir, exist_ok=True)
+    # assets are decoded lazily, so make sure the entry holds the pixels
+    for asset in theme.assets():
+        if not asset.is_static:
+            asset.source.load()
+    entry = {
+        "format": CACHE_FORMAT,
+        "version": __version__,
+        "assets": _asset_hashes(theme),
+        "theme": theme,
+    }
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            _Pickler(f, pickle.HIGHEST_PROTOCOL).dump(entry)
+        os.replace(temp_path, entry_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def import_(config_path: str, cache_dir: str, **import_options: typing.Any) -> Theme:
+    """
+    Theme.import_, but served from cache_dir when the theme and its assets haven't changed.
+    :param config_path: Path to the theme file.
+    :param cache_dir: Directory to keep compiled themes in. Created if needed.
+    :param import_options: Passed to Theme.import_ on a cache miss.
+    """
+    # hash before importing, so an edit made mid-import can't be stored under the new key
+    entry_path = _entry_path(config_path, cache_dir)
+    theme = _load(entry_path)
+    if theme is None:
+        theme = Theme.import_(config_path, **import_options)
+        _store(theme, cache_dir, entry_path)
+    return theme
@@ -0,0 +1,130 @@
+"""
+Tiled feature images, kept per theme so boxes of a size that was drawn before don't tile again.
+"""
+
+import threading
+import typing
+from collections import OrderedDict
+
+from PIL import Image
+
+from pixelscribe import Feature
+from pixelscribe.asset_cache import image_bytes
+from pixelscribe.feature_1d import Feature1D
+from pixelscribe.feature_2d import Feature2D
+
+# 1D features are keyed by (length,), 2D ones by (width, height)
+_TileKey = typing.Tuple[Feature, typing.Tuple[int, ...]]
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class TileCache:
+    """
+    Tiled images keyed by feature and requested size, with a byte budget.
+    When the budget is exceeded, the least recently used images are evicted first.
+    Cached images are handed out as they are, not copied, so don't draw on them.
+    On a miss, the feature's most recently tiled image (if still cached) is passed to
+    tile() as previous, so boxes that grow a line at a time mostly reuse the last result.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes: typing.Optional[int] = DEFAULT_MAX_BYTES):
+        """
+        :param max_bytes: Byte budget, or None for no limit. 0 turns caching off.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images: "OrderedDict[_TileKey, Image.Image]" = OrderedDict()
+        # the size each feature was last tiled at
+        self._latest: typing.Dict[Feature, typing.Tuple[int, ...]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        # pickled themes start out with an empty cache
+        return {"max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: typing.Dict[str, typing.Any]):
+        self.__init__(state["max_bytes"])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._images)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def tile_1d(self, feature: Feature1D, length: int) -> Image.Image:
+        """
+        feature.tile(length), from the cache if it was tiled at that length before.
+        """
+        return self._get_or_tile(
+            feature, (length,), lambda previous: feature.tile(length, previous)
+        )
+
+    def tile_2d(self, feature: Feature2D, width: int, height: int) -> Image.Image:
+        """
+        feature.tile(width, height), from the cache if it was tiled at that size before.
+        """
+        return self._get_or_tile(
+            feature,
+            (width, height),
+            lambda previous: feature.tile(width, height, previous),
+        )
+
+    def _get_or_tile(
+        self,
+        feature: Feature,
+        size: typing.Tuple[int, ...],
+        tile: typing.Callable[[typing.Optional[Image.Image]], Image.Image],
+    ) -> Image.Image:
+        key = (feature, size)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+            latest = self._latest.get(feature)
+            previous = None if latest is None else self._images.get((feature, latest))
+        image = tile(previous)
+        with self._lock:
+            self._latest[feature] = size
+            if key not in self._images:
+                self._images[key] = image
+                self.current_bytes += image_bytes(image)
+                self._evict()
+        return image
+
+    def resize(self, max_bytes: typing.Optional[int]):
+        """
+        Change the byte budget, evicting right away if it shrank.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """
+        Drop every cached image, e.g. after a feature's assets or overrides change.
+        """
+        with self._lock:
+            self._images.clear()
+            self._latest.clear()
+            self.current_bytes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self._images and self.current_bytes > self.max_bytes:
+            _, image = self._images.popitem(last=False)
+            self.current_bytes -= image_bytes(image)
@@ -0,0 +1,211 @@
+"""
+Benchmarks for pixelscribe.parser against the json module.
+
+Generates theme-shaped JSON documents of increasing size and nesting, parses each one with
+every parser, and writes the results to a JSON baseline file:
+
+    python -m tests.parser_benchmark --output parser_baseline.json
+    python -m tests.parser_benchmark --compare parser_baseline.json
+
+tests/parser_baseline.json holds the results from before the parser was optimized, and is
+what --compare uses by default. Timings depend on the machine, so for a fair comparison
+record a baseline of the old parser on the same machine.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import typing
+
+from pixelscribe.parser import reader
+from pixelscribe.parser.json_types import JSON
+
+SCALES = {"small": 10, "medium": 100, "large": 1000}
+BASELINE = os.path.join(os.path.dirname(__file__), "parser_baseline.json")
+
+
+def deep_overrides(scale: int) -> JSON:
+    """
+    Features with lots of overrides, each with a crop and an index.
+    """
+    return {
+        "features": [
+            {
+                "feature": "background",
+                "source": f"tiles/background_{i}.png",
+                "justify": "top left",
+                "overrides": [
+                    {
+                        "source": f"tiles/override_{j}.png",
+                        "crop": [j, j, j + 8, j + 8],
+                        "index": [j, -j],
+                    }
+                    for j in range(scale)
+                ],
+            }
+            for i in range(max(1, scale // 10))
+        ]
+    }
+
+
+def long_strings(scale: int) -> JSON:
+    """
+    Colors and sources with long strings full of escapes.
+    """
+    rng = random.Random(scale)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz\\"/\n\té☃'
+    return {
+        "colors": {
+            f"color_{i}": "".join(rng.choice(alphabet) for _ in range(200))
+            for i in range(scale)
+        },
+        "overlays": [
+            {"source": "".join(rng.choice(alphabet) for _ in range(500))}
+            for _ in range(scale // 10)
+        ],
+    }
+
+
+def many_numbers(scale: int) -> JSON:
+    """
+    Big arrays of ints, negative numbers, fractions and exponents.
+    """
+    rng = random.Random(scale)
+    return {
+        "ints": [rng.randint(-100000, 100000) for _ in range(scale * 20)],
+        "floats": [round(rng.uniform(-1000, 1000), 4) for _ in range(scale * 20)],
+        # tiny and huge floats are written with exponents
+        "exponents": [
+            rng.uniform(1, 10) * 10.0 ** rng.choice([-9, -7, 17, 25])
+            for _ in range(scale * 5)
+        ],
+    }
+
+
+CASES: typing.Dict[str, typing.Callable[[int], JSON]] = {
+    "deep_overrides": deep_overrides,
+    "long_strings": long_strings,
+    "many_numbers": many_numbers,
+}
+
+
+def _position_map_size(
+    result: typing.Any,
+) -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    if isinstance(result, tuple) and isinstance(result[1], reader.FilePosStorage):
+        store = typing.cast(reader.FilePosStorage, result[1])
+        return len(store), store.nbytes
+    return None, None
+
+
+PARSERS: typing.Dict[str, typing.Callable[[str], typing.Any]] = {
+    "json.loads": json.loads,
+    "reader.loads": reader.loads,
+    "reader.loads_deferred": reader.loads_deferred,
+    "reader.load": lambda source: reader.load(io.BytesIO(source.encode())),
+}
+
+
+def measure(
+    parse: typing.Callable[[str], typing.Any], source: str, repeat: int
+) -> typing.Dict[str, typing.Any]:
+    times: typing.List[float] = []
+    result: typing.Any = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse(source)
+        times.append(time.perf_counter() - start)
+    positions, position_bytes = _position_map_size(result)
+    del result
+
+    tracemalloc.start()
+    result = parse(source)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {
+        "seconds": min(times),
+        "allocated_peak_bytes": peak,
+        "retained_bytes": retained,
+        "positions": positions,
+        "position_map_bytes": position_bytes,
+    }
+
+
+def run(
+    scales: typing.Dict[str, int] = SCALES, repeat: int = 3
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    results: typing.List[typing.Dict[str, typing.Any]] = []
+    for case_name, generate in CASES.items():
+        for scale_name, scale in scales.items():
+            source = json.dumps(generate(scale), indent=2)
+            for parser_name, parse in PARSERS.items():
+                result = measure(parse, source, repeat)
+                result.update(
+                    case=case_name,
+                    scale=scale_name,
+                    parser=parser_name,
+                    source_bytes=len(source.encode()),
+                )
+                results.append(result)
+    return results
+
+
+def _key(result: typing.Dict[str, typing.Any]) -> typing.Tuple[str, str, str]:
+    return result["case"], result["scale"], result["parser"]
+
+
+def report(
+    results: typing.List[typing.Dict[str, typing.Any]],
+    baseline: typing.Optional[typing.List[typing.Dict[str, typing.Any]]] = None,
+):
+    previous = {_key(r): r for r in (baseline or [])}
+    for result in results:
+        line = (
+            f"{result['case']:>15} {result['scale']:>6} {result['parser']:>22}"
+            f" {result['seconds'] * 1000:10.2f}ms"
+            f" {result['allocated_peak_bytes'] / 1024:10.0f}KiB peak"
+        )
+        if result["position_map_bytes"] is not None:
+            line += f" {result['position_map_bytes'] / 1024:8.0f}KiB positions"
+        old = previous.get(_key(result))
+        if old is not None and old["seconds"] > 0:
+            line += f"  ({result['seconds'] / old['seconds']:.2f}x baseline)"
+        print(line)
+
+
+def main(argv: typing.Optional[typing.List[str]] = None):
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    args.add_argument("--output", help="write results to this JSON file")
+    args.add_argument(
+        "--compare",
+        help="results file to compare against (default: the committed baseline)",
+    )
+    args.add_argument("--repeat", type=int, default=3)
+    args.add_argument(
+        "--scale", action="append", choices=list(SCALES), help="scales to run"
+    )
+    options = args.parse_args(argv)
+
+    scales = {name: SCALES[name] for name in (options.scale or SCALES)}
+    results = run(scales, options.repeat)
+    baseline = None
+    compare = options.compare or (BASELINE if os.path.exists(BASELINE) else None)
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(
+                {"python": sys.version, "results": results}, f, indent=2, sort_keys=True
+            )
+
+
+if __name__ == "__main__":
+    main()
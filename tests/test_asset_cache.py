@@ -0,0 +1,199 @@
+import gc
+import os
+import shutil
+import threading
+import time
+import typing
+
+import pytest
+from PIL import Image
+
+from pixelscribe import asset_cache, asset_resource
+from pixelscribe.asset_cache import AssetCache, ImagePool, image_bytes
+from pixelscribe.theme import Theme
+
+
+def square(size: int) -> Image.Image:
+    return Image.new("RGBA", (size, size))
+
+
+def test_byte_accounting():
+    cache = AssetCache()
+    cache.put("a", square(4))
+    cache.put("b", square(2))
+    assert cache.current_bytes == 4 * 4 * 4 + 2 * 2 * 4
+    cache.put("a", square(1))
+    assert cache.current_bytes == 4 + 2 * 2 * 4
+    cache.discard("b")
+    assert cache.current_bytes == 4
+    assert image_bytes(square(3)) == 36
+
+
+def test_lru_eviction():
+    cache = AssetCache(max_bytes=3 * 64)
+    for path in "abc":
+        cache.put(path, square(4))
+    assert cache.get("a") is not None  # a is now the most recently used
+    cache.put("d", square(4))
+    assert "b" not in cache
+    assert all(path in cache for path in "acd")
+    assert cache.current_bytes == 3 * 64
+
+
+def test_pinned_entries_survive():
+    cache = AssetCache(max_bytes=64)
+    cache.put("a", square(4))
+    cache.pin("a")
+    cache.put("b", square(4))
+    assert "a" in cache and "b" not in cache
+    cache.unpin("a")
+    cache.put("c", square(4))
+    assert "a" not in cache and "c" in cache
+
+
+def test_resize_and_clear():
+    cache = AssetCache()
+    for path in "abcd":
+        cache.put(path, square(4))
+    cache.resize(2 * 64)
+    assert len(cache) == 2 and "c" in cache and "d" in cache
+    cache.clear()
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+def test_themes_pin_their_assets():
+    theme = Theme.import_(os.path.join("tests", "full_themes", "logo.json"))
+    paths = {asset.source_path for asset in theme.assets()}
+    assert all(asset_resource.shared_asset_cache.is_pinned(p) for p in paths)
+    del theme
+    gc.collect()
+    assert not any(asset_resource.shared_asset_cache.is_pinned(p) for p in paths)
+
+
+def test_get_or_load_decodes_once():
+    cache = AssetCache()
+    calls = []
+
+    def load() -> Image.Image:
+        calls.append(None)
+        time.sleep(0.05)  # keep the other threads waiting on this load
+        return square(2)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("a", load)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 8 and all(image is results[0] for image in results)
+    assert cache.get("a") is results[0]
+
+
+def test_get_or_load_errors_are_not_cached():
+    cache = AssetCache()
+
+    def fail() -> Image.Image:
+        raise OSError("unreadable")
+
+    with pytest.raises(OSError):
+        cache.get_or_load("a", fail)
+    assert "a" not in cache
+    assert cache.get_or_load("a", lambda: square(1)).size == (1, 1)
+
+
+def bump_mtime(path: str):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_check_files(tmp_path: typing.Any):
+    path = str(tmp_path / "a.png")
+    square(2).save(path)
+    cache = AssetCache(check_files=True)
+    first = cache.get_or_load(path, lambda: Image.open(path).convert("RGBA"))
+    assert cache.identity(path) is not None
+    assert cache.get(path) is first
+    square(3).save(path)
+    bump_mtime(path)
+    assert cache.get(path) is None
+    assert cache.identity(path) is None
+    # entries without a known file are left alone
+    cache.put("b", square(1))
+    assert cache.get("b") is not None
+
+
+def test_revalidate_with_hash(tmp_path: typing.Any):
+    path = str(tmp_path / "a.png")
+    shutil.copy(os.path.join("tests", "full_themes", "rune1.png"), path)
+    cache = AssetCache(verify_hash=True)
+    cache.get_or_load(path, lambda: square(16))
+    bump_mtime(path)
+    assert not cache.revalidate(path)  # touched, same contents
+    assert path in cache
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    assert cache.revalidate(path)
+    assert path not in cache
+
+
+def test_shared_images_are_counted_once():
+    cache = AssetCache()
+    image = square(4)
+    cache.put("a", image)
+    cache.put("b", image)
+    assert cache.current_bytes == 64
+    cache.discard("a")
+    assert cache.current_bytes == 64
+    cache.discard("b")
+    assert cache.current_bytes == 0
+
+
+def test_image_pool():
+    pool = ImagePool()
+    red = pool.intern(Image.new("RGBA", (4, 4), (255, 0, 0, 255)))
+    assert pool.intern(Image.new("RGBA", (4, 4), (255, 0, 0, 255))) is red
+    assert pool.intern(red) is red
+    assert pool.saved_bytes == 64
+    blue = pool.intern(Image.new("RGBA", (4, 4), (0, 0, 255, 255)))
+    assert blue is not red and len(pool) == 2
+
+    crop = pool.crop(red, (0, 0, 2, 2))
+    assert pool.crop(red, (0, 0, 2, 2)) is crop
+    # same pixels from a different box are shared by content
+    assert pool.crop(red, (2, 2, 4, 4)) is crop
+    assert pool.saved_bytes == 64 + 16 + 16
+    loose = square(4)
+    assert pool.crop(loose, (0, 0, 2, 2)) is not pool.crop(loose, (0, 0, 2, 2))
+
+    del red, blue, crop
+    gc.collect()
+    assert len(pool) == 0
+
+
+def test_image_pool_hashes_only_on_collisions(monkeypatch: typing.Any):
+    hashed: typing.List[typing.Tuple[int, int]] = []
+    content_key = asset_cache.content_key
+
+    def counting(image: Image.Image) -> asset_cache.ContentKey:
+        hashed.append(image.size)
+        return content_key(image)
+
+    monkeypatch.setattr(asset_cache, "content_key", counting)
+    pool = ImagePool()
+    big = pool.intern(square(64), ("big.png", 1))
+    small = pool.intern(square(2))
+    assert hashed == []
+    # found by identity, so not hashed either
+    assert pool.intern(square(64), ("big.png", 1)) is big
+    assert hashed == []
+    # same shape: both get hashed now, and only these
+    assert pool.intern(square(2)) is small
+    assert hashed == [(2, 2), (2, 2)]
+    corner = pool.crop(big, (0, 0, 8, 8))
+    assert pool.crop(big, (0, 0, 8, 8)) is corner
+    assert hashed == [(2, 2), (2, 2)]
+    assert len(pool) == 3
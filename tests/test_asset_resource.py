@@ -0,0 +1,148 @@
+import os
+import shutil
+import typing
+
+import pytest
+from PIL import Image
+
+from pixelscribe import AssetResource
+from pixelscribe.asset_resource import (
+    fill_tiles,
+    prefetch,
+    resolve_source,
+    set_asset_store,
+    shared_asset_cache,
+    shared_image_pool,
+)
+from pixelscribe.asset_store import PaletteAssetStore
+from pixelscribe.feature_2d import Feature2D, Feature2DOverride
+
+
+def test_crop_is_memoized():
+    asset = AssetResource.from_image(Image.new("RGBA", (16, 8)))
+    asset.crop = (2, 1, 10, 5)
+    assert asset.size == (8, 4)
+    assert asset.width == 8 and asset.height == 4
+    first = asset.get()
+    assert first.size == asset.size
+    assert asset.get() is first
+
+
+def test_crop_invalidation():
+    asset = AssetResource.from_image(Image.new("RGBA", (16, 8), (255, 0, 0, 255)))
+    before = asset.get()
+    asset.crop = (0, 0, 4, 4)
+    assert asset.get() is not before and asset.get().size == (4, 4)
+    cropped = asset.get()
+    asset.source = Image.new("RGBA", (16, 8), (0, 255, 0, 255))
+    assert asset.get() is not cropped
+    assert asset.get().getpixel((0, 0)) == (0, 255, 0, 255)
+
+
+@pytest.mark.parametrize("crop", [(10, 0, 5, 5), (0, 10, 5, 5)])
+def test_inverted_crop_fails_on_import(crop: typing.Tuple[int, int, int, int]):
+    path = os.path.join("tests", "full_themes", "rune1.png")
+    with pytest.raises(ValueError) as expected:
+        Image.new("RGBA", (16, 16)).crop(crop)
+    shared_asset_cache.discard(os.path.abspath(path))
+    with pytest.raises(ValueError, match=str(expected.value)):
+        AssetResource(path, crop)
+    asset = AssetResource(path)
+    with pytest.raises(ValueError, match=str(expected.value)):
+        asset.crop = crop
+
+
+def test_crop_past_the_source():
+    path = os.path.join("tests", "full_themes", "rune1.png")
+    crop = (-3, 2, 40, 30)
+    shared_asset_cache.discard(os.path.abspath(path))
+    expected = AssetResource(path, crop)
+    # cropping pads past the source, so the size read from the header is still right
+    assert expected.get().size == expected.size == (43, 28)
+    previous = set_asset_store(PaletteAssetStore())
+    try:
+        shared_asset_cache.discard(os.path.abspath(path))
+        compact = AssetResource(path, crop)
+        assert compact.source.mode == "P"
+        # padded with transparency either way
+        assert compact.get().tobytes() == expected.get().tobytes()
+    finally:
+        set_asset_store(previous)
+
+
+def test_decoding_is_deferred():
+    path = os.path.join("tests", "full_themes", "rune1.png")
+    shared_asset_cache.discard(os.path.abspath(path))
+    asset = AssetResource(path)
+    assert not asset.is_loaded
+    with Image.open(path) as image:
+        assert asset.size == image.size
+    # validating overrides only needs sizes
+    Feature2D(asset, "background", "center", [Feature2DOverride(asset, 0, 0)])
+    assert not asset.is_loaded
+    assert asset.get().size == asset.size
+    assert asset.is_loaded
+
+
+def test_prefetch():
+    theme_dir = os.path.join("tests", "full_themes")
+    paths = [
+        resolve_source(name, theme_dir)
+        for name in ("rune1.png", "example.png", "rune1.png", "missing.png")
+    ]
+    for path in paths:
+        shared_asset_cache.discard(path)
+    # duplicates are decoded once and unreadable files are left for import to report
+    assert prefetch(paths, max_workers=4) == 2
+    assert paths[0] in shared_asset_cache and paths[1] in shared_asset_cache
+    assert paths[3] not in shared_asset_cache
+    assert prefetch(paths) == 0
+    asset = AssetResource(paths[0])
+    assert asset.source is shared_asset_cache.get(paths[0])
+
+
+def test_refresh(tmp_path: typing.Any):
+    path = str(tmp_path / "rune1.png")
+    shutil.copy(os.path.join("tests", "full_themes", "rune1.png"), path)
+    whole = AssetResource(path)
+    cropped = AssetResource(path, (0, 0, 2, 2))
+    before = whole.get()
+    assert not whole.refresh() and whole.get() is before
+    replacement = Image.new("RGBA", (4, 3), (1, 2, 3, 4))
+    replacement.save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert whole.refresh()
+    assert whole.size == (4, 3) and whole.get().tobytes() == replacement.tobytes()
+    # an explicit crop is kept
+    assert cropped.refresh()
+    assert cropped.get().tobytes() == replacement.crop((0, 0, 2, 2)).tobytes()
+    assert not whole.refresh() and not cropped.refresh()
+    assert not AssetResource.from_image(replacement).refresh()
+
+
+def test_identical_assets_are_shared(tmp_path: typing.Any):
+    original = os.path.join("tests", "full_themes", "rune1.png")
+    copy = str(tmp_path / "copy_of_rune1.png")
+    shutil.copy(original, copy)
+    before = shared_image_pool.saved_bytes
+    a = AssetResource(original, (0, 0, 4, 4))
+    b = AssetResource(copy, (0, 0, 4, 4))
+    assert a.source is b.source
+    assert a.get() is b.get()
+    assert shared_image_pool.saved_bytes > before
+
+
+def test_fill_tiles_phase():
+    tile = Image.new("RGBA", (3, 2))
+    tile.putdata([(i, 0, 0, 255) for i in range(6)])
+    for phase in [(0, 0), (1, 1), (5, -1)]:
+        canvas = Image.new("RGBA", (9, 6))
+        fill_tiles(canvas, tile, 7, 5, phase)
+        for y in range(6):
+            for x in range(9):
+                expected = (0, 0, 0, 0)
+                if x < 7 and y < 5:
+                    tx, ty = (x + phase[0]) % 3, (y + phase[1]) % 2
+                    expected = tile.getpixel((tx, ty))
+                assert canvas.getpixel((x, y)) == expected, (phase, x, y)
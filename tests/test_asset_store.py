@@ -0,0 +1,244 @@
+import gc
+import glob
+import multiprocessing
+import os
+import shutil
+import typing
+
+import pytest
+from PIL import Image
+
+from pixelscribe import asset_resource, asset_store
+from pixelscribe.asset_resource import AssetResource
+from pixelscribe.asset_store import (
+    HEADER,
+    AssetStore,
+    DiskAssetStore,
+    PaletteAssetStore,
+    SharedMemoryAssetStore,
+    to_palette,
+)
+from pixelscribe.feature_1d import Feature1D
+from pixelscribe.feature_2d import Feature2D
+from pixelscribe.theme import Theme
+
+RUNE = os.path.join("tests", "full_themes", "rune1.png")
+
+
+@pytest.fixture
+def asset_path(tmp_path: typing.Any) -> str:
+    path = str(tmp_path / "rune1.png")
+    shutil.copy(RUNE, path)
+    return path
+
+
+def fail_decode(path: str) -> Image.Image:
+    raise AssertionError(f"{path} was decoded again")
+
+
+def test_disk_store_roundtrip(
+    asset_path: str, tmp_path: typing.Any, monkeypatch: typing.Any
+):
+    store = DiskAssetStore(str(tmp_path / "decoded"))
+    decoded = store.load(asset_path)
+    assert os.path.exists(store.entry_path(asset_path))
+    monkeypatch.setattr(asset_store, "decode", fail_decode)
+    mapped = store.load(asset_path)
+    assert mapped.mode == "RGBA" and mapped.size == decoded.size
+    assert mapped.tobytes() == decoded.tobytes()
+    assert mapped.readonly
+    assert mapped.crop((0, 0, 2, 2)).tobytes() == decoded.crop((0, 0, 2, 2)).tobytes()
+
+
+@pytest.mark.parametrize("verify_hash", [False, True])
+def test_disk_store_revalidates(
+    asset_path: str, tmp_path: typing.Any, verify_hash: bool
+):
+    store = DiskAssetStore(str(tmp_path / "decoded"), verify_hash)
+    store.load(asset_path)
+    replacement = Image.new("RGBA", (3, 5), (1, 2, 3, 4))
+    replacement.save(asset_path)
+    stat = os.stat(asset_path)
+    os.utime(asset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.load(asset_path).tobytes() == replacement.tobytes()
+
+
+def test_disk_store_ignores_broken_entries(asset_path: str, tmp_path: typing.Any):
+    store = DiskAssetStore(str(tmp_path / "decoded"))
+    expected = store.load(asset_path).tobytes()
+    entry = store.entry_path(asset_path)
+    with open(entry, "r+b") as f:
+        f.truncate(HEADER.size + 4)
+    assert store.load(asset_path).tobytes() == expected
+    assert os.path.getsize(entry) == HEADER.size + len(expected)
+
+
+def test_set_asset_store(asset_path: str, tmp_path: typing.Any):
+    store = DiskAssetStore(str(tmp_path / "decoded"))
+    previous = asset_resource.set_asset_store(store)
+    try:
+        assert type(previous) is AssetStore
+        assert asset_resource.get_asset_store() is store
+        asset = AssetResource(asset_path)
+        assert asset.get().size == asset.size
+        assert os.path.exists(store.entry_path(asset.source_path))
+    finally:
+        asset_resource.set_asset_store(previous)
+
+
+def attach_in_worker(namespace: str, path: str) -> bytes:
+    asset_store.decode = fail_decode
+    return SharedMemoryAssetStore(namespace).load(path).tobytes()
+
+
+def test_shared_memory_store(asset_path: str, monkeypatch: typing.Any):
+    namespace = f"pxt{os.getpid()}"
+    owner = SharedMemoryAssetStore(namespace, owner=True)
+    try:
+        published = owner.load(asset_path)
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(1) as pool:
+            shared = pool.apply(attach_in_worker, (namespace, asset_path))
+        assert shared == published.tobytes()
+        # attaching in this process works too, and doesn't decode
+        monkeypatch.setattr(asset_store, "decode", fail_decode)
+        worker = SharedMemoryAssetStore(namespace)
+        attached = worker.load(asset_path)
+        assert attached.readonly and attached.tobytes() == published.tobytes()
+        worker.close()
+        assert attached.tobytes() == published.tobytes()
+    finally:
+        owner.close()
+    # the segment is gone, so workers fall back to decoding
+    monkeypatch.undo()
+    assert SharedMemoryAssetStore(namespace).load(asset_path).tobytes() == shared
+
+
+def test_shared_memory_store_revalidates(asset_path: str):
+    namespace = f"pxt{os.getpid()}"
+    owner = SharedMemoryAssetStore(namespace, owner=True)
+    try:
+        owner.load(asset_path)
+        replacement = Image.new("RGBA", (3, 5), (1, 2, 3, 4))
+        replacement.save(asset_path)
+        stat = os.stat(asset_path)
+        os.utime(asset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        # out of date: workers decode a private copy until the owner publishes again
+        stale = SharedMemoryAssetStore(namespace).load(asset_path)
+        assert not stale.readonly and stale.tobytes() == replacement.tobytes()
+        assert owner.load(asset_path).tobytes() == replacement.tobytes()
+        fresh = SharedMemoryAssetStore(namespace).load(asset_path)
+        assert fresh.readonly and fresh.tobytes() == replacement.tobytes()
+    finally:
+        owner.close()
+
+
+def test_shared_memory_store_follows_republish(asset_path: str):
+    namespace = f"pxt{os.getpid()}"
+    owner = SharedMemoryAssetStore(namespace, owner=True)
+    worker = SharedMemoryAssetStore(namespace)
+    try:
+        owner.load(asset_path)
+        assert worker.load(asset_path).readonly
+        replacement = Image.new("RGBA", (3, 5), (1, 2, 3, 4))
+        replacement.save(asset_path)
+        stat = os.stat(asset_path)
+        os.utime(asset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert not worker.load(asset_path).readonly
+        owner.load(asset_path)
+        # the same worker picks up the new segment instead of decoding from now on
+        for _ in range(2):
+            shared = worker.load(asset_path)
+            assert shared.readonly and shared.tobytes() == replacement.tobytes()
+    finally:
+        worker.close()
+        owner.close()
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_shared_memory_images_outlive_the_store(asset_path: str):
+    namespace = f"pxt{os.getpid()}"
+    owner = SharedMemoryAssetStore(namespace, owner=True)
+    try:
+        expected = owner.load(asset_path).tobytes()
+        worker = SharedMemoryAssetStore(namespace)
+        attached = worker.load(asset_path)
+        del worker
+        gc.collect()
+        # the mapping stays open while the image reads from it
+        assert attached.tobytes() == expected
+        del attached
+        gc.collect()
+        assert SharedMemoryAssetStore(namespace).load(asset_path).tobytes() == expected
+    finally:
+        owner.close()
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob("tests/full_themes/*.png")))
+def test_to_palette_is_lossless(path: str):
+    image = asset_store.decode(path)
+    compact = to_palette(image)
+    assert compact is not None and compact.mode == "P"
+    assert compact.convert("RGBA").tobytes() == image.tobytes()
+
+
+def test_to_palette_needs_few_colors():
+    many = Image.new("RGBA", (17, 17))
+    many.putdata([(i, i // 256, 0, 255) for i in range(17 * 17)])
+    assert to_palette(many) is None
+    # colors that only differ in alpha stay apart
+    alpha = Image.new("RGBA", (2, 1))
+    alpha.putdata([(0, 0, 0, 0), (0, 0, 0, 255)])
+    compact = to_palette(alpha)
+    assert compact is not None
+    assert compact.convert("RGBA").tobytes() == alpha.tobytes()
+
+
+def test_to_palette_full_palette():
+    # 256 colors with every channel varying, so bands have to be merged before the lookup
+    full = Image.new("RGBA", (64, 16))
+    full.putdata(
+        [((i * 7) % 256, (i * 13) % 256, 255 - i, (i * 101) % 256) for i in range(256)]
+        * 4
+    )
+    compact = to_palette(full)
+    assert compact is not None and compact.mode == "P"
+    assert compact.convert("RGBA").tobytes() == full.tobytes()
+
+
+def draw_features(theme: Theme) -> typing.List[bytes]:
+    return [
+        theme.get_feature_by_type("background", Feature2D).tile(37, 21).tobytes(),
+        theme.get_feature_by_type("top_edge", Feature1D).tile(37).tobytes(),
+        theme.get_feature_by_type("left_edge", Feature1D).tile(21).tobytes(),
+    ]
+
+
+def test_palette_store_output_is_unchanged():
+    path = os.path.join("tests", "full_themes", "logo.json")
+    expected = draw_features(Theme.import_(path))
+    previous = asset_resource.set_asset_store(PaletteAssetStore())
+    try:
+        theme = Theme.import_(path)
+        assert draw_features(theme) == expected
+        for asset in theme.assets():
+            assert asset.source.mode == "P"
+            assert asset.get().mode == "RGBA"
+            # expanded once, not on every call
+            assert asset.get() is asset.get()
+        sources = {id(a.source): a.source for a in theme.assets()}
+        expanded = {id(a.get()): a.get() for a in theme.assets()}
+        resident = sum(image.width * image.height for image in sources.values())
+        resident += sum(image.width * image.height * 4 for image in expanded.values())
+        # the expanded crops are counted along with the palette sources
+        assert asset_resource.shared_asset_cache.current_bytes == resident
+        assert theme.asset_stats().resident_bytes == resident
+        # only the pinned sources fit, so expansions are evicted and redone as needed
+        palette_bytes = sum(image.width * image.height for image in sources.values())
+        asset_resource.shared_asset_cache.resize(palette_bytes)
+        assert asset_resource.shared_asset_cache.current_bytes == palette_bytes
+        assert draw_features(theme) == expected
+        assert asset_resource.shared_asset_cache.current_bytes == palette_bytes
+    finally:
+        asset_resource.shared_asset_cache.resize(None)
+        asset_resource.set_asset_store(previous)
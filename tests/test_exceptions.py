@@ -0,0 +1,86 @@
+import os
+import random
+import typing
+
+import pytest
+
+from pixelscribe import ValidationError
+from pixelscribe.exceptions import SourceMap, line_col
+from pixelscribe.json_exception_handler import handle
+from pixelscribe.parser import loads
+from pixelscribe.theme import Theme
+
+SOURCES = ["", "\n", "one line", "a\nb\n", "a\r\nbb\r\n\nccc", "\n\nx\n\n"]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_line_col(source: str):
+    source_map = SourceMap(source)
+    for index in range(len(source) + 1):
+        assert source_map.line_col(index) == line_col(source, index)
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_lines(source: str):
+    source_map = SourceMap(source)
+    expected = [line.rstrip("\r") for line in source.split("\n")]
+    if source.endswith("\n") or source == "":
+        expected.pop()
+    assert source_map.line_count == len(expected)
+    assert [source_map.line(i + 1) for i in range(source_map.line_count)] == expected
+
+
+@pytest.mark.parametrize("source", SOURCES + ["\u00e9\n\U0001f600x\n\u00e9\u00e9"])
+def test_char_index(source: str):
+    source_map = SourceMap(source)
+    encoded = source.encode("utf-8")
+    for offset in range(len(encoded) + 2):
+        # offsets inside a character count it as one replaced character, like decoding
+        expected = len(encoded[:offset].decode("utf-8", errors="replace"))
+        assert source_map.char_index(offset) == expected
+
+
+def test_handle_uses_source_map():
+    source = '{\n  "colors": {\n    "a": 5\n  }\n}\n'
+    _, file_map = loads(source)
+    error = ValidationError("bad color", ValidationError.ErrorCode.WRONG_TYPE)
+    error.json_path = ["colors", "a"]
+    # doesn't exist on disk, so everything has to come from the map
+    error.set_source_file(f"does-not-exist-{random.random()}.json")
+    message = handle(error, file_map, SourceMap(source))
+    assert "line 3 (column 10)" in message
+    assert '"a": 5' in message
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"defer_positions": True}, {"stream": True}], ids=str
+)
+def test_theme_errors_have_locations(options: typing.Dict[str, bool]):
+    with pytest.raises(ValidationError) as e:
+        Theme.import_(os.path.join("tests", "full_themes", "i_deep_1.json"), **options)
+    assert "line 13 (column 16)" in str(e.value)
+
+
+def test_lazy_rendering():
+    with pytest.raises(ValidationError) as e:
+        Theme.import_(os.path.join("tests", "full_themes", "i_deep_1.json"))
+    error = e.value
+    assert error.finalized
+    assert error.to_dict() == {
+        "message": "Feature2DOverride index should be a list, not int",
+        "code": ValidationError.ErrorCode.WRONG_TYPE.value,
+        "path": ["features", 0, "overrides", 1, "index"],
+        "file": os.path.join("tests", "full_themes", "i_deep_1.json"),
+        "offset": 213,
+        "line": 13,
+        "column": 16,
+    }
+    plain = error.render(color=False)
+    assert "\x1b[" not in plain
+    assert str(error).startswith(plain.splitlines()[0])
+
+
+def test_unfinalized_message():
+    error = ValidationError("oops", ValidationError.ErrorCode.MISSING_VALUE, "a")
+    assert str(error) == "[code 1 (MISSING_VALUE)] oops"
+    assert error.to_dict()["line"] is None
@@ -1,12 +1,14 @@
 import random
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 import pytest
 from PIL import Image
 
 from pixelscribe.asset_resource import AssetResource
-from pixelscribe.feature_1d import Direction, Feature1D, Justify1D
+from pixelscribe.feature_1d import Direction, Feature1D, Feature1DOverride, Justify1D
+from tests import tiling_reference
 from tests.bench import asset_resource_horizontal_16, i13h, i13v, i16h, i16v
+from tests.tiling_reference import pattern
 
 all_anchors = {
     "start": Justify1D.START,
@@ -65,3 +67,55 @@ def test_rendering(
     else:
         assert image.width == pool[direction].width
         assert image.height == size
+
+
+# (index, override size); overrides don't have to match the tile, so some spill over
+OVERRIDE_LAYOUTS = [
+    [],
+    [(0, None), (2, None), (-3, None)],
+    [(0, (2, 2)), (1, (20, 9)), (-1, (3, 1))],
+    [(-2, (30, 30)), (-1, None), (4, (1, 40))],
+]
+
+
+@pytest.mark.parametrize("anchor", ["start", "center", "end"])
+@pytest.mark.parametrize("direction", [Direction.HORIZONTAL, Direction.VERTICAL])
+@pytest.mark.parametrize("tile", [(4, 6), (5, 3), (1, 1)])
+@pytest.mark.parametrize("layout", OVERRIDE_LAYOUTS)
+def test_tiling_matches_reference(
+    anchor: str,
+    direction: Direction,
+    tile: Tuple[int, int],
+    layout: List[Tuple[int, Optional[Tuple[int, int]]]],
+):
+    overrides = [
+        Feature1DOverride(pattern(*(size or tile), seed), index)
+        for seed, (index, size) in enumerate(layout, 1)
+    ]
+    feature = Feature1D(pattern(*tile, 0), "left_edge", anchor, direction, overrides)
+    for length in [1, 2, 5, 6, 7, 13, 24, 31]:
+        expected = tiling_reference.tile_1d(feature, length)
+        tiled = feature.tile(length)
+        assert tiled.size == expected.size
+        assert tiled.tobytes() == expected.tobytes(), length
+
+
+@pytest.mark.parametrize("anchor", ["start", "center", "end"])
+@pytest.mark.parametrize("direction", [Direction.HORIZONTAL, Direction.VERTICAL])
+@pytest.mark.parametrize("layout", OVERRIDE_LAYOUTS)
+def test_extending_matches_reference(
+    anchor: str,
+    direction: Direction,
+    layout: List[Tuple[int, Optional[Tuple[int, int]]]],
+):
+    overrides = [
+        Feature1DOverride(pattern(*(size or (4, 6)), seed), index)
+        for seed, (index, size) in enumerate(layout, 1)
+    ]
+    feature = Feature1D(pattern(4, 6, 0), "left_edge", anchor, direction, overrides)
+    lengths = [1, 5, 6, 7, 13, 24, 31, 30]
+    for before, after in zip(lengths, lengths[1:] + lengths[:1]):
+        expected = tiling_reference.tile_1d(feature, after)
+        tiled = feature.tile(after, feature.tile(before))
+        assert tiled.size == expected.size
+        assert tiled.tobytes() == expected.tobytes(), (before, after)
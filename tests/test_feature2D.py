@@ -3,13 +3,15 @@ import typing
 import pytest
 
 from pixelscribe.asset_resource import AssetResource, get_justify
-from pixelscribe.feature_2d import Feature2D, Justify2D
+from pixelscribe.feature_2d import Feature2D, Feature2DOverride, Justify2D
+from tests import tiling_reference
 from tests.bench import (
     asset_resource_13,
     asset_resource_16,
     override_2d_13,
     override_2d_16,
 )
+from tests.tiling_reference import pattern
 
 verbose = {
     "top left": (Justify2D.X.LEFT, Justify2D.Y.TOP),
@@ -69,3 +71,44 @@ def test_tiling(image: AssetResource, anchor: str, size: typing.Tuple[int, int])
     f = Feature2D(image, "n/a", anchor)
     t = f.tile(*size)
     assert t.size == size
+
+
+def patterned_feature(tile: typing.Tuple[int, int], anchor: str) -> Feature2D:
+    overrides = [
+        Feature2DOverride(pattern(*tile, seed), *index)
+        for seed, index in enumerate([(0, 0), (-1, 2), (3, -2), (1, 1), (40, 0)], 1)
+    ]
+    return Feature2D(pattern(*tile, 0), "background", anchor, overrides)
+
+
+@pytest.mark.parametrize("anchor", verbose.keys())
+@pytest.mark.parametrize("tile", [(8, 8), (5, 3), (1, 7)])
+def test_tiling_matches_reference(anchor: str, tile: typing.Tuple[int, int]):
+    feature = patterned_feature(tile, anchor)
+    for size in [(1, 1), (7, 9), (8, 8), (16, 17), (33, 20), (64, 5)]:
+        expected = tiling_reference.tile_2d(feature, *size)
+        tiled = feature.tile(*size)
+        assert tiled.size == expected.size
+        assert tiled.tobytes() == expected.tobytes(), size
+
+
+@pytest.mark.parametrize("anchor", verbose.keys())
+@pytest.mark.parametrize("tile", [(8, 8), (5, 3)])
+def test_extending_matches_reference(anchor: str, tile: typing.Tuple[int, int]):
+    feature = patterned_feature(tile, anchor)
+    sizes = [(7, 9), (7, 10), (7, 17), (8, 17), (33, 20), (33, 5), (6, 40), (7, 9)]
+    for before, after in zip(sizes, sizes[1:]):
+        expected = tiling_reference.tile_2d(feature, *after)
+        tiled = feature.tile(*after, feature.tile(*before))
+        assert tiled.size == expected.size
+        assert tiled.tobytes() == expected.tobytes(), (before, after)
+
+
+def test_set_overrides_retiles():
+    feature = patterned_feature((5, 3), "center")
+    feature.set_overrides(
+        [Feature2DOverride(pattern(5, 3, 9), x, -x) for x in range(-4, 5)]
+    )
+    for size in [(9, 9), (40, 33)]:
+        expected = tiling_reference.tile_2d(feature, *size)
+        assert feature.tile(*size).tobytes() == expected.tobytes(), size
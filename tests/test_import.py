@@ -8,7 +8,8 @@ from typing import Any, Callable, Dict, List, NamedTuple, Tuple, cast
 
 import pytest
 
-from pixelscribe.asset_resource import AssetResource, Feature
+from pixelscribe.asset_resource import AssetResource, Feature, shared_asset_cache
+from pixelscribe.exceptions import ValidationError, ValidationErrorGroup
 from pixelscribe.feature_1d import Feature1D
 from pixelscribe.feature_2d import Feature2D
 from pixelscribe.overlay import Overlay
@@ -140,10 +141,13 @@ def get_full_tests() -> List[Tuple[str, bool]]:
     return full_tests
 
 
+@pytest.mark.parametrize(
+    "defer_positions, stream", [(False, False), (True, False), (False, True)]
+)
 @pytest.mark.parametrize("path, is_invalid", get_full_tests())
-def test_full_themes(path: str, is_invalid: bool):
+def test_full_themes(path: str, is_invalid: bool, defer_positions: bool, stream: bool):
     def exec_target():
-        Theme.import_(path)
+        Theme.import_(path, defer_positions, stream)
 
     if is_invalid:
         with pytest.raises(Exception) as e:
@@ -151,3 +155,38 @@ def test_full_themes(path: str, is_invalid: bool):
         print(e.value)
     else:
         exec_target()
+
+
+@pytest.mark.parametrize("path, is_invalid", get_full_tests())
+def test_prefetch(path: str, is_invalid: bool):
+    if is_invalid:
+        with pytest.raises(Exception) as e:
+            Theme.import_(path, prefetch_workers=4)
+        with pytest.raises(Exception) as expected:
+            Theme.import_(path)
+        assert str(e.value) == str(expected.value)
+    else:
+        theme = Theme.import_(path, prefetch_workers=4)
+        assert all(
+            asset.source_path in shared_asset_cache
+            for asset in theme.assets()
+            if not asset.is_static
+        )
+
+
+def test_collect_errors():
+    path = os.path.join("tests", "full_themes", "i_many_errors.json")
+    with pytest.raises(ValidationErrorGroup) as e:
+        Theme.import_(path, collect_errors=True)
+    assert [error.json_path for error in e.value.errors] == [
+        ["features", 0, "justify"],
+        ["features", 2],
+        ["overlays", 0, "mode"],
+        ["colors", "link"],
+        ["colors", "quote"],
+    ]
+    assert str(e.value).startswith("5 errors found")
+    # without collecting, the first error stops the import
+    with pytest.raises(ValidationError) as first:
+        Theme.import_(path)
+    assert first.value.json_path == ["features", 0, "justify"]
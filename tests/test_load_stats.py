@@ -0,0 +1,57 @@
+import os
+import typing
+
+import pytest
+
+from pixelscribe import asset_resource, load_stats
+from pixelscribe.asset_resource import AssetResource
+from pixelscribe.theme import Theme
+from tests.theme_files import LOGO_ASSETS, copy_logo_theme
+
+
+@pytest.fixture
+def theme_dir(tmp_path: typing.Any) -> str:
+    # fresh paths, so nothing is cached yet
+    copy_logo_theme(tmp_path)
+    return str(tmp_path)
+
+
+def test_process_stats(theme_dir: str):
+    path = os.path.join(theme_dir, "rune1.png")
+    loads: typing.List[load_stats.AssetLoad] = []
+    previous = load_stats.set_load_callback(loads.append)
+    asset_resource.reset_asset_stats()
+    try:
+        AssetResource(path).get()
+        AssetResource(path).get()
+    finally:
+        load_stats.set_load_callback(previous)
+    stats = asset_resource.asset_stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert stats.hit_rate == 0.5
+    assert stats.decoded_bytes == 16 * 16 * 4
+    assert stats.largest_path == os.path.abspath(path)
+    assert stats.resident_bytes == asset_resource.shared_asset_cache.current_bytes
+    assert [(load.path, load.size) for load in loads] == [
+        (os.path.abspath(path), (16, 16))
+    ]
+    asset_resource.reset_asset_stats()
+    assert asset_resource.asset_stats().misses == 0
+
+
+@pytest.mark.parametrize("prefetch_workers", [0, 4])
+def test_theme_stats(theme_dir: str, prefetch_workers: int):
+    theme = Theme.import_(
+        os.path.join(theme_dir, "logo.json"), prefetch_workers=prefetch_workers
+    )
+    other = Theme.import_(os.path.join("tests", "full_themes", "background.json"))
+    other.reset_asset_stats()
+    theme.draw(64, 32)
+    stats = theme.asset_stats()
+    # every file is decoded once, by prefetching or on first use while drawing
+    assert stats.misses == len(LOGO_ASSETS)
+    assert stats.hits > 0
+    assert stats.resident_bytes == stats.decoded_bytes
+    assert other.asset_stats().misses == 0
+    theme.reset_asset_stats()
+    assert theme.asset_stats().hits == 0
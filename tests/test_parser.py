@@ -1,12 +1,16 @@
+import io
 import json
 import random
 import string
+import time
+import tracemalloc
 import typing
 
 import pytest
 
 from pixelscribe import JSON
-from pixelscribe.parser import loads
+from pixelscribe.parser import load, loads, loads_deferred
+from tests import parser_benchmark
 
 
 def test_list():
@@ -114,3 +118,121 @@ def test_auto_generate(iteration: int):
         print("want: ", data_t)
         print("have: ", loads(data_s)[0])
         assert False
+
+
+def test_positions():
+    source = '{"a": [1, {"b": "c"}],\n "d": null}'
+    _, positions = loads(source)
+    assert positions.get([]) == 0
+    assert positions.get(["a"]) == 6
+    assert positions.get(["a", 0]) == 7
+    assert positions.get(["a", 1]) == 10
+    assert positions.get(["a", 1, "b"]) == 16
+    assert positions.get(["d"]) == 29
+
+
+@pytest.mark.parametrize("iteration", range(1, 20))
+def test_deferred_positions(iteration: int):
+    data_s, _ = generate_fuzzing_data(20)
+    data_s = json.dumps(json.loads(data_s), indent=random.choice([None, 2]))
+    _, eager = loads(data_s)
+    _, deferred = loads_deferred(data_s)
+    for path, position in eager.positions.items():
+        assert deferred.get(path) == position
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "0.3",
+        "[1.5e3, -0.0, -2, 1e-5, 0.1, 12345678901234567890123]",
+        '{"a": {"b": 1, "b": 2}}',
+        '[{"a": 1}, {"a": 2, "a": 3}]',
+        "1e400",
+        "[-1e400]",
+        '{"a": "x\U0001f600y"}',
+        '{"a": "x\ty"}',
+        '{"a": 1} trailing',
+        '{"a": 1.}',
+        '"\\ud83d\\ude00"',
+        '"\\ud83d"',
+        "[1,]",
+        "[NaN]",
+        '"\\x"',
+    ],
+)
+def test_deferred_matches_eager(source: str):
+    try:
+        expected: typing.Any = loads(source)[0]
+    except (KeyError, OverflowError, ValueError) as e:
+        with pytest.raises(type(e)) as deferred_error:
+            loads_deferred(source)
+        assert str(deferred_error.value) == str(e)
+        return
+    result = loads_deferred(source)[0]
+    assert result == expected
+    assert repr(result) == repr(expected)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_load_chunked(chunk_size: int):
+    data_s, _ = generate_fuzzing_data(20)
+    data_s = json.dumps(json.loads(data_s), indent=2)
+    expected, expected_positions = loads(data_s)
+    result, positions = load(io.BytesIO(data_s.encode()), chunk_size)
+    assert result == expected
+    assert positions.positions == expected_positions.positions
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5])
+def test_load_chunked_escapes(chunk_size: int):
+    # escapes and multi-byte characters split across chunk boundaries
+    data = {"a\\": 'x\\"y\\\\\\u2603 ☃\n', "b": ["\\", '"', ""]}
+    source = json.dumps(data, ensure_ascii=False)
+    assert load(io.BytesIO(source.encode()), chunk_size)[0] == data
+    with pytest.raises(ValueError):
+        load(io.BytesIO(source[:20].encode()), chunk_size)
+
+
+def test_load_long_string():
+    value = ("x" * 997 + '\\"') * 4000
+    source = json.dumps({"long": value, "after": [1]})
+    started = time.perf_counter()
+    result, positions = load(io.BytesIO(source.encode()), 4096)
+    # scanning a string that spans many chunks used to take quadratic time
+    assert time.perf_counter() - started < 2
+    assert result == {"long": value, "after": [1]}
+    assert positions.get(["after"]) == source.index("[1]")
+
+
+def test_positions_are_smaller_than_the_document():
+    overrides = [
+        {"source": "a.png", "index": [i % 70, i // 70], "crop": [0, 0, 16, 16]}
+        for i in range(5000)
+    ]
+    source = json.dumps({"features": [{"type": "background", "overrides": overrides}]})
+    tracemalloc.start()
+    try:
+        document = json.loads(source)
+        document_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    result, positions = loads(source)
+    assert result == document
+    assert positions.nbytes < document_bytes
+    path = ["features", 0, "overrides", 4999, "index", 1]
+    assert source[positions.get(path) :].startswith("71]")
+
+
+def test_load_byte_offsets():
+    source = '{"☃": "☃", "a": 1}'.encode()
+    result, positions = load(source)
+    assert result == {"☃": "☃", "a": 1}
+    assert positions.byte_offsets
+    assert positions.get(["a"]) == source.index(b"1")
+
+
+def test_benchmark_smoke():
+    results = parser_benchmark.run({"tiny": 1}, repeat=1)
+    assert {r["parser"] for r in results} == set(parser_benchmark.PARSERS)
+    assert all(r["seconds"] >= 0 for r in results)
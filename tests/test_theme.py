@@ -1,6 +1,11 @@
+import os
+import typing
+
 import pytest
+from PIL import Image
 
 from pixelscribe.theme import DEFAULT, Theme
+from tests.theme_files import copy_logo_theme
 
 from .test_import import get_full_tests
 
@@ -19,3 +24,36 @@ def test_does_the_default_work(hsize: int, vsize: int):
 def test_themes(target: str, hsize: int, vsize: int):
     theme = Theme.import_(target)
     theme.draw(hsize, vsize, None)
+
+
+def test_refresh(tmp_path: typing.Any):
+    theme = Theme.import_(copy_logo_theme(tmp_path))
+    theme.draw(64, 32)
+    assert theme.refresh() == []
+    rune = str(tmp_path / "rune2.png")
+    Image.new("RGBA", (16, 16), (255, 0, 0, 255)).save(rune)
+    stat = os.stat(rune)
+    os.utime(rune, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert theme.refresh() == [os.path.abspath(rune)]
+    assert all(
+        asset.is_loaded == (asset.source_path != os.path.abspath(rune))
+        for asset in theme.assets()
+        if not asset.is_static
+    )
+    theme.draw(64, 32)
+
+
+def test_refresh_deleted_asset(tmp_path: typing.Any):
+    theme = Theme.import_(copy_logo_theme(tmp_path))
+    theme.draw(64, 32)
+    rune = os.path.abspath(tmp_path / "rune2.png")
+    moved = str(tmp_path / "moved.png")
+    os.rename(rune, moved)
+    # every asset is looked at, and the deleted one reports the missing file when used
+    assert theme.refresh() == [rune]
+    assert theme.refresh() == []
+    with pytest.raises(FileNotFoundError):
+        theme.draw(64, 32)
+    os.rename(moved, rune)
+    assert theme.refresh() == [rune]
+    theme.draw(64, 32)
@@ -0,0 +1,67 @@
+import typing
+
+import pytest
+from PIL import Image
+
+from pixelscribe import asset_resource, load_stats, theme_cache
+from pixelscribe.feature_2d import Feature2D
+from pixelscribe.theme import DEFAULT, Theme
+from tests.theme_files import copy_logo_theme
+
+
+@pytest.fixture
+def theme_path(tmp_path: typing.Any) -> str:
+    return copy_logo_theme(tmp_path)
+
+
+def test_roundtrip(theme_path: str, tmp_path: typing.Any):
+    cache_dir = str(tmp_path / "cache")
+    assert theme_cache.load(theme_path, cache_dir) is None
+    imported = theme_cache.import_(theme_path, cache_dir)
+    cached = theme_cache.load(theme_path, cache_dir)
+    assert cached is not None
+    assert cached.inherits_from is DEFAULT
+    assert cached.colors == imported.colors
+    assert [f.feature_type for f in cached.features] == [
+        f.feature_type for f in imported.features
+    ]
+    assert cached.file_map is not None and imported.file_map is not None
+    assert cached.file_map.positions == imported.file_map.positions
+    background = cached.get_feature_by_type("background", Feature2D)
+    assert (
+        background.tile(40, 40).tobytes()
+        == imported.get_feature_by_type("background", Feature2D).tile(40, 40).tobytes()
+    )
+
+
+def test_hit_holds_decoded_pixels(theme_path: str, tmp_path: typing.Any):
+    cache_dir = str(tmp_path / "cache")
+    theme_cache.import_(theme_path, cache_dir)
+    # as if in a fresh process: nothing decoded yet
+    asset_resource.shared_asset_cache.clear()
+    loads: typing.List[load_stats.AssetLoad] = []
+    previous = load_stats.set_load_callback(loads.append)
+    try:
+        cached = theme_cache.load(theme_path, cache_dir)
+        assert cached is not None
+        cached.draw(64, 32)
+    finally:
+        load_stats.set_load_callback(previous)
+    assert loads == []
+    assert cached.asset_stats().misses == 0
+
+
+def test_asset_change_invalidates(theme_path: str, tmp_path: typing.Any):
+    cache_dir = str(tmp_path / "cache")
+    theme_cache.import_(theme_path, cache_dir)
+    Image.new("RGBA", (16, 16), (1, 2, 3, 255)).save(tmp_path / "rune2.png")
+    assert theme_cache.load(theme_path, cache_dir) is None
+
+
+def test_theme_change_invalidates(theme_path: str, tmp_path: typing.Any):
+    cache_dir = str(tmp_path / "cache")
+    theme_cache.import_(theme_path, cache_dir)
+    with open(theme_path, "a") as f:
+        f.write("\n")
+    assert theme_cache.load(theme_path, cache_dir) is None
+    assert isinstance(theme_cache.import_(theme_path, cache_dir), Theme)
@@ -0,0 +1,72 @@
+import os
+import pickle
+import typing
+
+from PIL import Image
+
+from pixelscribe.feature_1d import Feature1D
+from pixelscribe.feature_2d import Feature2D
+from pixelscribe.theme import Theme
+from pixelscribe.tile_cache import TileCache
+from tests.bench import asset_resource_13, asset_resource_16
+
+
+def test_hits_and_misses():
+    cache = TileCache()
+    background = Feature2D(asset_resource_16, "background", "center")
+    edge = Feature1D(asset_resource_13, "top_edge")
+    first = cache.tile_2d(background, 40, 30)
+    assert first.tobytes() == background.tile(40, 30).tobytes()
+    assert cache.tile_2d(background, 40, 30) is first
+    assert cache.tile_2d(background, 30, 40) is not first
+    assert cache.tile_1d(edge, 40).tobytes() == edge.tile(40).tobytes()
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.hit_rate == 0.25
+    assert cache.current_bytes == (40 * 30 * 2 + 40 * 13) * 4
+    cache.reset_stats()
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_growing_reuses_the_last_tile(monkeypatch: typing.Any):
+    cache = TileCache()
+    background = Feature2D(asset_resource_16, "background", "top left")
+    tile = background.tile
+    previous_sizes: typing.List[typing.Optional[typing.Tuple[int, int]]] = []
+
+    def spy(width: int, height: int, previous: typing.Optional[Image.Image] = None):
+        previous_sizes.append(None if previous is None else previous.size)
+        return tile(width, height, previous)
+
+    monkeypatch.setattr(background, "tile", spy)
+    for height in range(30, 34):
+        tiled = cache.tile_2d(background, 40, height)
+        assert tiled.tobytes() == tile(40, height).tobytes()
+    assert previous_sizes == [None, (40, 30), (40, 31), (40, 32)]
+
+
+def test_eviction():
+    background = Feature2D(asset_resource_16, "background", "center")
+    cache = TileCache(2 * 10 * 10 * 4)
+    a = cache.tile_2d(background, 10, 10)
+    cache.tile_2d(background, 10, 11)
+    assert len(cache) == 1  # over budget, so a went
+    assert cache.tile_2d(background, 10, 10) is not a
+    cache.resize(0)
+    assert len(cache) == 0 and cache.current_bytes == 0
+    cache.tile_2d(background, 10, 10)
+    assert len(cache) == 0
+    assert cache.misses == 4
+
+
+def test_theme_reuses_tiles():
+    theme = Theme.import_(os.path.join("tests", "full_themes", "logo.json"))
+    theme.draw(64, 32)
+    # the background and four edges
+    assert (theme.tile_cache.hits, theme.tile_cache.misses) == (0, 5)
+    theme.draw(64, 32)
+    assert (theme.tile_cache.hits, theme.tile_cache.misses) == (5, 5)
+    theme.draw(65, 32)
+    assert (theme.tile_cache.hits, theme.tile_cache.misses) == (7, 8)
+    restored: Theme = pickle.loads(pickle.dumps(theme))
+    assert len(restored.tile_cache) == 0
+    assert restored.tile_cache.max_bytes == theme.tile_cache.max_bytes
@@ -0,0 +1,21 @@
+"""
+Copies of test themes in a temporary directory, for tests that need paths nothing has cached
+yet or that edit the files.
+"""
+
+import os
+import shutil
+import typing
+
+THEMES = os.path.join("tests", "full_themes")
+LOGO_ASSETS = ["rune1.png", "rune2.png", "pixelscribe_assets.png", "pixelscribe.png"]
+
+
+def copy_logo_theme(directory: typing.Any) -> str:
+    """
+    Copy the logo theme and every asset it uses into a directory.
+    :return: The path of the copied logo.json.
+    """
+    for name in LOGO_ASSETS + ["logo.json"]:
+        shutil.copy(os.path.join(THEMES, name), os.path.join(directory, name))
+    return os.path.join(str(directory), "logo.json")
@@ -0,0 +1,93 @@
+"""
+The tiling algorithms as they were before tiling was optimized, kept as a reference that
+the optimized versions must match pixel for pixel.
+"""
+
+from PIL import Image
+
+from pixelscribe.asset_resource import AssetResource, next_multiple, odd
+from pixelscribe.feature_1d import Direction, Feature1D, Justify1D
+from pixelscribe.feature_2d import Feature2D, Justify2D
+
+
+def pattern(width: int, height: int, seed: int) -> AssetResource:
+    # every pixel different, so a tile that's off by one pixel shows up
+    image = Image.new("RGBA", (width, height))
+    image.putdata(
+        [
+            ((x * 37 + seed) % 256, (y * 53 + seed) % 256, seed % 256, 255 - x - y)
+            for y in range(height)
+            for x in range(width)
+        ]
+    )
+    return AssetResource.from_image(image)
+
+
+def tile_1d(feature: Feature1D, length: int) -> Image.Image:
+    img = feature._asset.get()
+    if feature.direction == Direction.VERTICAL:
+        img = img.transpose(Image.ROTATE_90)
+    tiled = Image.new("RGBA", (odd(next_multiple(length, img.width)), img.height))
+    tile_count = tiled.width // img.width
+    center_pos = 0
+    if feature.justify == Justify1D.CENTER:
+        center_pos = tile_count // 2
+    elif feature.justify == Justify1D.END:
+        center_pos = tile_count - 1
+    for x in range(tile_count):
+        vx = x - center_pos
+        if vx in feature.overrides:
+            override = feature.overrides[vx]
+            tiled.paste(override.asset.get(), (x * img.width, 0))
+        else:
+            tiled.paste(img, (x * img.width, 0))
+    crop_from = 0
+    if feature.justify == Justify1D.CENTER:
+        crop_from = (tiled.width - length) // 2
+    elif feature.justify == Justify1D.END:
+        crop_from = tiled.width - length
+    crop_to = crop_from + length
+    tiled = tiled.crop((crop_from, 0, crop_to, img.height))
+    if feature.direction == Direction.VERTICAL:
+        tiled = tiled.transpose(Image.ROTATE_270)
+    return tiled
+
+
+def tile_2d(feature: Feature2D, width: int, height: int) -> Image.Image:
+    img = feature._asset.get()
+    tiled = Image.new(
+        "RGBA",
+        (
+            odd(next_multiple(width, img.width)),
+            odd(next_multiple(height, img.height)),
+        ),
+    )
+    tile_count = tiled.width // img.width, tiled.height // img.height
+    center_pos = [0, 0]
+    if feature.justifyX == Justify2D.X.CENTER:
+        center_pos[0] = tile_count[0] // 2
+    elif feature.justifyX == Justify2D.X.RIGHT:
+        center_pos[0] = tile_count[0] - 1
+    if feature.justifyY == Justify2D.Y.CENTER:
+        center_pos[1] = tile_count[1] // 2
+    elif feature.justifyY == Justify2D.Y.BOTTOM:
+        center_pos[1] = tile_count[1] - 1
+    for x in range(tile_count[0]):
+        for y in range(tile_count[1]):
+            vx, vy = x - center_pos[0], y - center_pos[1]
+            if (vx, vy) in feature._overrides:
+                override = feature._overrides[(vx, vy)]
+                tiled.paste(override.asset.get(), (x * img.width, y * img.height))
+            else:
+                tiled.paste(img, (x * img.width, y * img.height))
+    crop_from = [0, 0]
+    if feature.justifyX == Justify2D.X.CENTER:
+        crop_from[0] = (tiled.width - width) // 2
+    elif feature.justifyX == Justify2D.X.RIGHT:
+        crop_from[0] = tiled.width - width
+    if feature.justifyY == Justify2D.Y.CENTER:
+        crop_from[1] = (tiled.height - height) // 2
+    elif feature.justifyY == Justify2D.Y.BOTTOM:
+        crop_from[1] = tiled.height - height
+    crop_to = [crop_from[0] + width, crop_from[1] + height]
+    return tiled.crop((crop_from[0], crop_from[1], crop_to[0], crop_to[1]))